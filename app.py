@@ -3,11 +3,11 @@ import streamlit as st
 import uuid
 import logging
 
-from pipeline.preprocessing import chunk_tokens
-from pipeline.entity_extraction import extract_graph
-from pipeline.relation_extractor import extract_relations
-from pipeline.graph_builder import build_and_store_graph
+from pipeline.jobs import get_scheduler
 from pipeline.neo4j_client import init_indexes, check_apoc
+from pipeline.resources import get_config, warm_up
+from pipeline.spool import spool_lag
+from pipeline.answer import AnswerTrace, answer_stream
 
 # -------------------------------------------------------------------
 # Configure logging
@@ -18,76 +18,141 @@ logging.basicConfig(
 )
 log = logging.getLogger("app")
 
+PRIORITIES = {"high": 1, "normal": 5, "low": 9}
+
 # -------------------------------------------------------------------
 # Streamlit Page Setup
 # -------------------------------------------------------------------
 st.set_page_config(page_title="GraphRAG Knowledge Graph Builder", layout="wide")
 st.title("GraphRAG Knowledge Graph Builder")
 
-st.write("Enter or paste your text below to extract entities and relationships and build a Neo4j knowledge graph.")
+# -------------------------------------------------------------------
+# Initialize shared resources and Neo4j (once per process, not per rerun)
+# -------------------------------------------------------------------
+@st.cache_resource(show_spinner="Warming up models and Neo4j connection...")
+def init_backend() -> bool:
+    """Load shared resources and prepare Neo4j. Cached across reruns and sessions."""
+    warm_up()
+    if not check_apoc():
+        return False
+    init_indexes()
+    return True
+
+
+if not init_backend():
+    init_backend.clear()
+    st.error("APOC not detected. Please enable APOC in Neo4j plugins before proceeding.")
+    st.stop()
 
 # -------------------------------------------------------------------
-# Initialize Neo4j Connection
+# Build graph view: submit ingestion jobs, poll their progress
 # -------------------------------------------------------------------
-if "db_ready" not in st.session_state:
-    st.session_state["db_ready"] = False
-
-if not st.session_state["db_ready"]:
-    st.info("Checking Neo4j connection...")
-    apoc_available = check_apoc()
-    if apoc_available:
-        init_indexes()
-        st.session_state["db_ready"] = True
-        st.success("Connected to Neo4j and initialized indexes.")
-    else:
-        st.error("APOC not detected. Please enable APOC in Neo4j plugins before proceeding.")
-        st.stop()
+def _owner_id() -> str:
+    """Per-user id kept in the URL so a page refresh still shows the user's jobs."""
+    if "owner" not in st.query_params:
+        st.query_params["owner"] = uuid.uuid4().hex[:8]
+    return st.query_params["owner"]
+
+
+def render_builder():
+    st.write("Enter or paste your text below to extract entities and relationships and build a Neo4j knowledge graph.")
+    input_text = st.text_area("Enter text to process:", height=250, placeholder="Paste or type your text here...")
+
+    run_relations = st.checkbox("Run additional relation refinement (slower, more detailed)", value=True)
+    short_docs = st.checkbox(
+        "Input is many short documents separated by blank lines (packs several per LLM call)", value=False
+    )
+    priority = st.select_slider("Priority", options=["high", "normal", "low"], value="normal")
+
+    if st.button("Process Text"):
+        if not input_text.strip():
+            st.warning("Please enter some text before processing.")
+        else:
+            job_id = get_scheduler().submit(
+                input_text,
+                owner=_owner_id(),
+                priority=PRIORITIES[priority],
+                run_relations=run_relations,
+                short_docs=short_docs,
+            )
+            st.success(f"Queued ingestion job {job_id}. Progress is shown below; you can keep working or refresh.")
+
+    render_jobs()
+
+
+@st.fragment(run_every=2.0)
+def render_jobs():
+    scheduler = get_scheduler()
+    jobs = scheduler.list_jobs(owner=_owner_id())
+    st.subheader("Your ingestion jobs")
+    st.caption(f"{scheduler.queue_depth()} jobs queued across all users")
+    if not jobs:
+        st.caption("No jobs yet.")
+
+    for job in jobs:
+        with st.container(border=True):
+            eta = f", ETA {job['eta_s']:.0f}s" if job["eta_s"] is not None else ""
+            st.write(
+                f"**{job['id']}** — {job['status']} · {job['done_chunks']}/{job['total_chunks']} chunks · "
+                f"{job['chunks_per_s']:.2f} chunks/s{eta}"
+            )
+            st.progress(job["fraction"])
+            st.caption(
+                f"Entities: {job['entities']} · Relations: {job['relations']} · "
+                f"Routes: {', '.join(f'{k}={v}' for k, v in sorted(job['routes'].items())) or '-'}"
+                + (f" · Failed chunks: {job['failed_chunks']}" if job["failed_chunks"] else "")
+                + (f" · Error: {job['error']}" if job["error"] else "")
+            )
+            if job["status"] in ("queued", "running") and st.button("Cancel", key=f"cancel_{job['id']}"):
+                scheduler.cancel(job["id"])
+
+    if get_config().use_write_spool:
+        lag = spool_lag()
+        st.caption(
+            f"Neo4j write spool: {lag['pending_records']} chunks pending "
+            f"({lag['pending_bytes'] / 1024:.1f} KiB, oldest {lag['oldest_pending_age_s']}s)"
+            + (f" · {lag['quarantined']} quarantined (see {lag['dead_letter_path']})" if lag["quarantined"] else "")
+            + (f" — last error: {lag['last_error']}" if lag["last_error"] else "")
+        )
+
 
 # -------------------------------------------------------------------
-# User Input
+# Chat view: streamed answers over the graph
 # -------------------------------------------------------------------
-input_text = st.text_area("Enter text to process:", height=250, placeholder="Paste or type your text here...")
-
-run_relations = st.checkbox("Run additional relation refinement (slower, more detailed)", value=True)
-
-if st.button("Process Text"):
-    if not input_text.strip():
-        st.warning("Please enter some text before processing.")
-    else:
-        st.info("Processing input text...")
-        chunks = chunk_tokens(input_text)
-
-        all_entities, all_relations = [], []
-
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"user_chunk_{uuid.uuid4().hex[:8]}"
-            log.info(f"Processing chunk {i+1}/{len(chunks)}: {len(chunk)} characters")
-
-            # Step 1: Extract entities and base relations
-            graph_data = extract_graph(chunk)
-            entities = graph_data.get("entities", [])
-            base_relations = graph_data.get("relations", [])
-            log.info(f"Extracted {len(entities)} entities and {len(base_relations)} base relations from chunk {chunk_id}")
-
-            # Step 2: Optionally extract refined relations
-            refined_relations = []
-            if run_relations:
-                refined_relations = extract_relations(chunk)
-                log.info(f"Extracted {len(refined_relations)} refined relations from chunk {chunk_id}")
-
-            all_relations_chunk = base_relations + refined_relations
-            all_entities.extend(entities)
-            all_relations.extend(all_relations_chunk)
-
-            # Step 3: Build and store the combined graph in Neo4j
-            try:
-                build_and_store_graph(chunk_id, chunk, entities, all_relations_chunk)
-                log.info(f"Stored chunk {chunk_id} in Neo4j with {len(entities)} entities and {len(all_relations_chunk)} relations.")
-            except Exception as e:
-                log.error(f"Failed to store chunk {chunk_id}: {e}")
-
-        st.success("Processing complete. Knowledge graph has been built successfully.")
-        st.write(f"Total Entities: {len(all_entities)}")
-        st.write(f"Total Relations: {len(all_relations)}")
-
-        log.info(f"Total Entities: {len(all_entities)} | Total Relations: {len(all_relations)}")
+def render_chat():
+    st.write("Ask a question; the answer is generated from ranked graph evidence and streamed as it arrives.")
+    history = st.session_state.setdefault("chat_history", [])
+
+    for msg in history:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+            if msg.get("meta"):
+                st.caption(msg["meta"])
+
+    question = st.chat_input("Ask about the knowledge graph...")
+    if not question:
+        return
+
+    history.append({"role": "user", "content": question})
+    with st.chat_message("user"):
+        st.markdown(question)
+
+    with st.chat_message("assistant"):
+        trace = AnswerTrace(question=question)
+        text = st.write_stream(answer_stream(question, trace=trace))
+        ttft = f"{trace.ttft_s:.2f}s" if trace.ttft_s is not None else "n/a"
+        meta = (
+            f"{len(trace.entities)} entities · {trace.relations_used} relations · {trace.chunks_used} passages · "
+            f"retrieval {trace.retrieval_s:.2f}s · first token {ttft} · total {trace.total_s:.2f}s"
+        )
+        st.caption(meta)
+        with st.expander("Evidence used"):
+            st.text(trace.evidence or "(none)")
+    history.append({"role": "assistant", "content": text, "meta": meta})
+
+
+mode = st.sidebar.radio("Mode", ["Build graph", "Ask questions"])
+if mode == "Build graph":
+    render_builder()
+else:
+    render_chat()
@@ -20,6 +20,11 @@ class Neo4jConfig:
     uri: str
     user: str
     password: str
+    # Connection pool tuning (one pooled driver is shared process-wide)
+    max_connection_pool_size: int = 50
+    connection_acquisition_timeout: float = 30.0
+    max_connection_lifetime: float = 3600.0
+    connection_timeout: float = 15.0
 
 @dataclass(frozen=True)
 class GeminiConfig:
@@ -38,6 +43,9 @@ class LocalLLMConfig:
     n_ctx: int = 4096
     n_gpu_layers: int = 32  
     verbose: bool = True
+    # Prompt-lookup speculative decoding (drafts copied from the prompt, no second model)
+    speculative: bool = False
+    draft_tokens: int = 10
 
 @dataclass(frozen=True)
 class AppConfig:
@@ -50,9 +58,42 @@ class AppConfig:
     neo4j: Neo4jConfig
     gemini: GeminiConfig
     local_llm: LocalLLMConfig
+    spacy_model: str = os.getenv("SPACY_MODEL", "en_core_web_sm")
+    tokenizer_encoding: str = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
     leiden_resolution: float = float(os.getenv("LEIDEN_RESOLUTION", "1.0"))
     retrieval_search_limit: int = int(os.getenv("RETRIEVAL_SEARCH_LIMIT", "10"))
     neo4j_query_limit: int = int(os.getenv("NEO4J_QUERY_LIMIT", "100"))
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+    evidence_max_tokens: int = int(os.getenv("EVIDENCE_MAX_TOKENS", "80"))
+    context_chunk_budget: int = int(os.getenv("CONTEXT_CHUNK_BUDGET", "400"))
+    context_max_chunks: int = int(os.getenv("CONTEXT_MAX_CHUNKS", "3"))
+    retrieval_workers: int = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+    answer_max_words: int = int(os.getenv("ANSWER_MAX_WORDS", "250"))
+    typed_relations: bool = os.getenv("TYPED_RELATIONS", "false").lower() in ["1", "true", "yes"]
+    relation_max_chunk_ids: int = int(os.getenv("RELATION_MAX_CHUNK_IDS", "20"))
+    use_write_spool: bool = os.getenv("USE_WRITE_SPOOL", "true").lower() in ["1", "true", "yes"]
+    spool_segment_bytes: int = int(os.getenv("SPOOL_SEGMENT_BYTES", "8000000"))
+    spool_batch_size: int = int(os.getenv("SPOOL_BATCH_SIZE", "50"))
+    spool_max_attempts: int = int(os.getenv("SPOOL_MAX_ATTEMPTS", "5"))
+    cascade_enabled: bool = os.getenv("CASCADE_ENABLED", "true").lower() in ["1", "true", "yes"]
+    cascade_min_alpha_ratio: float = float(os.getenv("CASCADE_MIN_ALPHA_RATIO", "0.5"))
+    cascade_min_density: float = float(os.getenv("CASCADE_MIN_DENSITY", "0.5"))
+    cascade_rules_confidence: float = float(os.getenv("CASCADE_RULES_CONFIDENCE", "0.8"))
+    cascade_rules_max_entities: int = int(os.getenv("CASCADE_RULES_MAX_ENTITIES", "6"))
+    pack_small_chunks: bool = os.getenv("PACK_SMALL_CHUNKS", "true").lower() in ["1", "true", "yes"]
+    pack_max_chunk_tokens: int = int(os.getenv("PACK_MAX_CHUNK_TOKENS", "200"))
+    pack_output_tokens_per_chunk: int = int(os.getenv("PACK_OUTPUT_TOKENS_PER_CHUNK", "256"))
+    chunk_text_external: bool = os.getenv("CHUNK_TEXT_EXTERNAL", "true").lower() in ["1", "true", "yes"]
+    chunk_preview_chars: int = int(os.getenv("CHUNK_PREVIEW_CHARS", "200"))
+    job_workers: int = int(os.getenv("JOB_WORKERS", "2"))
+    job_max_per_owner: int = int(os.getenv("JOB_MAX_PER_OWNER", "1"))
+    relation_pair_window: int = int(os.getenv("RELATION_PAIR_WINDOW", "2"))
+    relation_max_pairs: int = int(os.getenv("RELATION_MAX_PAIRS", "24"))
+    prune_min_confidence: float = float(os.getenv("PRUNE_MIN_CONFIDENCE", "0.0"))
+    prune_min_support: int = int(os.getenv("PRUNE_MIN_SUPPORT", "1"))
+    prune_chunk_ttl_days: float = float(os.getenv("PRUNE_CHUNK_TTL_DAYS", "0"))
+    prune_orphans: bool = os.getenv("PRUNE_ORPHANS", "true").lower() in ["1", "true", "yes"]
+    prune_orphan_max_mentions: int = int(os.getenv("PRUNE_ORPHAN_MAX_MENTIONS", "1"))
     run_relation_extraction: bool = os.getenv("RUN_RELATION_EXTRACTION", "true").lower() in ["1", "true", "yes"]
 
 def load_config() -> AppConfig:
@@ -60,6 +101,10 @@ def load_config() -> AppConfig:
         uri=_req("NEO4J_URI"),
         user=_req("NEO4J_USER"),
         password=_req("NEO4J_PASSWORD"),
+        max_connection_pool_size=int(os.getenv("NEO4J_MAX_POOL_SIZE", "50")),
+        connection_acquisition_timeout=float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "30")),
+        max_connection_lifetime=float(os.getenv("NEO4J_MAX_CONN_LIFETIME", "3600")),
+        connection_timeout=float(os.getenv("NEO4J_CONN_TIMEOUT", "15")),
     )
 
     # Gemini can be optional during local-only testing; raise only if you use it.
@@ -82,13 +127,19 @@ def load_config() -> AppConfig:
         logs_dir=ROOT / "logs",
         prompts_dir=ROOT / "pipeline" / "prompts",
         neo4j=neo4j,
-        gemini=GeminiConfig(api_key=gem_key),
+        gemini=GeminiConfig(
+            api_key=gem_key,
+            model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
+            endpoint=os.getenv("GEMINI_ENDPOINT", "https://generativelanguage.googleapis.com/v1beta/models"),
+        ),
         local_llm=LocalLLMConfig(
             model_dir=local_model_dir,
             model_file=local_model_file,
             n_ctx=int(os.getenv("LOCAL_N_CTX", "2048")),
             n_gpu_layers=int(os.getenv("LOCAL_N_GPU_LAYERS", "32")),
-            verbose=os.getenv("LOCAL_VERBOSE", "0") == "1"
+            verbose=os.getenv("LOCAL_VERBOSE", "0") == "1",
+            speculative=os.getenv("LOCAL_SPECULATIVE", "0") == "1",
+            draft_tokens=int(os.getenv("LOCAL_DRAFT_TOKENS", "10")),
         ),
     )
 
@@ -3,10 +3,9 @@ import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
-from config.config import load_config
+from pipeline.resources import get_config
 
-_cfg = load_config()
-LOG_DIR = _cfg.logs_dir
+LOG_DIR = get_config().logs_dir
 
 # Ensure directory exists
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -36,7 +35,13 @@ modules = [
     "clustering",
     "entity_extraction",
     "relation_extractor",
-    "graph_builder"
+    "graph_builder",
+    "resources",
+    "spool",
+    "answer",
+    "benchmark",
+    "blob_store",
+    "jobs"
 ]
 
 for mod in modules:
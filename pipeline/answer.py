@@ -0,0 +1,115 @@
+"""
+Question answering over the graph: overlapped retrieval → ranked context → streamed Gemini answer.
+
+Every stage is injectable (`search`, `subgraph`, `postings`, `stream`) so the whole path can run
+against a graph stand-in and a local Gemini stub (set GEMINI_ENDPOINT to its URL).
+"""
+from __future__ import annotations
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from pipeline.entity_extraction import spacy_candidates
+from pipeline.llm_client_gemini import gemini_stream
+from pipeline.resources import get_config
+from pipeline.retrieval import pack_chunk_evidence, pack_evidence, retrieve_subgraphs
+from pipeline.utils import dedup_keep_order, format_with_vars, read_text
+
+log = logging.getLogger("answer")
+
+_STOPWORDS = {
+    "what", "which", "who", "whom", "whose", "where", "when", "why", "how", "does", "did",
+    "the", "and", "for", "with", "from", "that", "this", "these", "those", "are", "was",
+    "were", "is", "of", "to", "in", "on", "a", "an", "about", "between", "tell", "me",
+    "please", "can", "could", "would", "should", "have", "has", "had", "its", "their",
+}
+_MAX_TERMS = 6
+
+
+@dataclass
+class AnswerTrace:
+    """Per-question timings (seconds since the question arrived) and what was retrieved."""
+    question: str
+    terms: List[str] = field(default_factory=list)
+    entities: List[str] = field(default_factory=list)
+    evidence: str = ""
+    relations_used: int = 0
+    chunks_used: int = 0
+    retrieval_s: float = 0.0
+    prompt_ready_s: float = 0.0
+    ttft_s: Optional[float] = None
+    total_s: float = 0.0
+    output_chars: int = 0
+
+
+def query_terms(question: str) -> List[str]:
+    """Entity-like search terms for a question: spaCy candidates, else content words."""
+    terms = spacy_candidates(question)
+    if not terms:
+        words = re.findall(r"[\w'-]+", question)
+        terms = [w for w in words if len(w) >= 3 and w.lower() not in _STOPWORDS]
+    return dedup_keep_order(terms)[:_MAX_TERMS]
+
+
+def build_prompt(question: str, evidence: str, max_words: int | None = None) -> str:
+    tpl = read_text(get_config().prompts_dir / "basic_search_system_prompt.txt")
+    return format_with_vars(
+        tpl,
+        question=question,
+        evidence=evidence or "(no graph evidence found)",
+        max_words=max_words or get_config().answer_max_words,
+    )
+
+
+def answer_stream(question: str,
+                  trace: AnswerTrace | None = None,
+                  k_hop: int = 1,
+                  token_budget: int | None = None,
+                  search: Callable[[str], List[Dict]] | None = None,
+                  subgraph: Callable[..., Dict] | None = None,
+                  postings: Callable[[str], List[Dict]] | None = None,
+                  stream: Callable[[str], Iterator[str]] | None = None) -> Iterator[str]:
+    """
+    Yield the answer as it is generated. Pass an AnswerTrace to receive the
+    retrieval/prompt/first-token/total timings once the generator is exhausted.
+    """
+    trace = trace if trace is not None else AnswerTrace(question=question)
+    stream = stream or gemini_stream
+    t0 = time.perf_counter()
+
+    trace.terms = query_terms(question)
+    ents, subgraphs = retrieve_subgraphs(trace.terms or [question], k_hop=k_hop, search=search, subgraph=subgraph)
+    selected = pack_evidence(ents, subgraphs, token_budget=token_budget)
+    trace.entities = ents
+    passages = pack_chunk_evidence(ents, postings=postings)
+    trace.relations_used = len(selected)
+    trace.chunks_used = len(passages)
+    trace.evidence = "\n".join([c.text for c in selected] + [p["evidence"] for p in passages])
+    trace.retrieval_s = time.perf_counter() - t0
+
+    prompt = build_prompt(question, trace.evidence)
+    trace.prompt_ready_s = time.perf_counter() - t0
+    log.info(
+        f"Answering '{question}': terms={trace.terms}, {len(ents)} entities, "
+        f"{trace.relations_used} relations, {trace.chunks_used} source passages, prompt ready in {trace.prompt_ready_s:.3f}s"
+    )
+
+    try:
+        for delta in stream(prompt):
+            if trace.ttft_s is None:
+                trace.ttft_s = time.perf_counter() - t0
+            trace.output_chars += len(delta)
+            yield delta
+    finally:
+        trace.total_s = time.perf_counter() - t0
+        ttft = f"{trace.ttft_s:.3f}s" if trace.ttft_s is not None else "n/a"
+        log.info(f"Answer complete: ttft={ttft}, total={trace.total_s:.3f}s, {trace.output_chars} chars")
+
+
+def answer(question: str, **kwargs) -> tuple[str, AnswerTrace]:
+    """Non-streaming convenience wrapper around answer_stream."""
+    trace = AnswerTrace(question=question)
+    text = "".join(answer_stream(question, trace=trace, **kwargs))
+    return text, trace
@@ -0,0 +1,308 @@
+"""
+Retrieval latency / recall benchmark.
+
+Generates a synthetic graph (power-law degrees, a few hub entities), loads it into
+Neo4j through the normal write path, replays a query set and reports latency
+percentiles, rows fetched and evidence recall against a gold set — for the graph
+retrieval and for a vector-only (bag-of-words cosine over chunk text) baseline.
+Results are written as JSON so two runs can be diffed:
+
+    python -m pipeline.benchmark --scale small --queries 100
+    python -m pipeline.benchmark --scale small --keep --out before.json
+    python -m pipeline.benchmark --scale small --skip-load --out after.json
+
+The synthetic graph is written to the configured database and dropped after the
+run unless --keep is given (then drop it with a last run without --keep).
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from pipeline.neo4j_client import k_hop_chunks, store_chunks_bulk
+from pipeline.resources import get_config, get_driver
+from pipeline.retrieval import pack_evidence, retrieve_subgraphs
+
+log = logging.getLogger("benchmark")
+
+SCALES: Dict[str, Tuple[int, int]] = {
+    # name: (entities, relations)
+    "small": (500, 2_000),
+    "medium": (5_000, 20_000),
+    "large": (50_000, 200_000),
+}
+_REL_TYPES = ["WORKS_FOR", "LOCATED_IN", "PART_OF", "FOUNDED_BY", "PARTNER_OF", "OWNS", "MEMBER_OF", "CAPITAL_OF"]
+_RELS_PER_CHUNK = 5
+_GOLD_PER_QUERY = 5
+
+
+@dataclass
+class SyntheticGraph:
+    scale: str
+    entities: List[str]
+    relations: List[Dict]                 # {source, target, relation, evidence, confidence}
+    chunks: List[Dict] = field(default_factory=list)  # {chunk, entities, relations} records
+
+    @property
+    def source(self) -> str:
+        return f"bench:{self.scale}"
+
+
+def generate_graph(scale: str, seed: int = 7, alpha: float = 1.1) -> SyntheticGraph:
+    """
+    Endpoints are drawn from a Zipf-like distribution over entity rank, so a handful
+    of low-rank entities become hubs and most entities have degree 1–2.
+    """
+    n_ent, n_rel = SCALES[scale]
+    rng = random.Random(seed)
+    # fixed width keeps names prefix-free: no entity name contains another
+    entities = [f"bench_{scale}_e{i:06d}" for i in range(n_ent)]
+    weights = [1.0 / (i + 1) ** alpha for i in range(n_ent)]
+
+    seen = set()
+    relations: List[Dict] = []
+    while len(relations) < n_rel:
+        a, b = rng.choices(entities, weights=weights, k=2)
+        rel = rng.choice(_REL_TYPES)
+        if a == b or (a, rel, b) in seen:
+            continue
+        seen.add((a, rel, b))
+        relations.append({
+            "source": a,
+            "target": b,
+            "relation": rel,
+            "evidence": f"{a} {rel.lower().replace('_', ' ')} {b}.",
+            "confidence": round(rng.uniform(0.3, 1.0), 2),
+        })
+
+    g = SyntheticGraph(scale=scale, entities=entities, relations=relations)
+    for i in range(0, len(relations), _RELS_PER_CHUNK):
+        rels = relations[i:i + _RELS_PER_CHUNK]
+        ents = sorted({r["source"] for r in rels} | {r["target"] for r in rels})
+        filler = " ".join(rng.choice(["Reportedly,", "Meanwhile,", "In addition,", "Notably,"]) for _ in range(2))
+        g.chunks.append({
+            "chunk": {"id": f"bench_{scale}_c{i // _RELS_PER_CHUNK}", "text": filler + " " + " ".join(r["evidence"] for r in rels), "source": g.source},
+            "entities": [{"name": e, "type": "BENCH", "description": ""} for e in ents],
+            "relations": rels,
+        })
+    log.info(f"Generated '{scale}' graph: {len(entities)} entities, {len(relations)} relations, {len(g.chunks)} chunks")
+    return g
+
+
+def load_graph(g: SyntheticGraph, batch: int = 200) -> float:
+    """Write the synthetic chunks through the normal bulk store path. Returns seconds."""
+    start = time.time()
+    for i in range(0, len(g.chunks), batch):
+        store_chunks_bulk(g.chunks[i:i + batch])
+    took = time.time() - start
+    log.info(f"Loaded {len(g.chunks)} chunks in {took:.1f}s")
+    return took
+
+
+def drop_graph(g: SyntheticGraph) -> None:
+    with get_driver().session() as s:
+        s.run(
+            "CALL apoc.periodic.iterate("
+            "'MATCH (n) WHERE (n:Chunk AND n.source=$src) OR (n:Entity AND n.name STARTS WITH $prefix) RETURN n', "
+            "'DETACH DELETE n', {batchSize:1000, params:{src:$src, prefix:$prefix}})",
+            src=g.source, prefix=f"bench_{g.scale}_",
+        )
+    log.info(f"Dropped benchmark graph '{g.scale}'")
+
+
+def build_queries(g: SyntheticGraph, n: int, seed: int = 11) -> List[Dict]:
+    """
+    Half the queries hit hubs, half hit the tail. Gold evidence for a query is the
+    entity's most confident incident relations.
+    """
+    rng = random.Random(seed)
+    incident: Dict[str, List[Dict]] = defaultdict(list)
+    for r in g.relations:
+        incident[r["source"]].append(r)
+        incident[r["target"]].append(r)
+    ranked = sorted((e for e in g.entities if incident[e]), key=lambda e: -len(incident[e]))
+    hubs, tail = ranked[: max(1, len(ranked) // 50)], ranked[len(ranked) // 50:]
+
+    queries = []
+    for i in range(n):
+        ent = rng.choice(hubs if i % 2 == 0 else tail)
+        gold = sorted(incident[ent], key=lambda r: -r["confidence"])[:_GOLD_PER_QUERY]
+        queries.append({
+            "query": ent,
+            "kind": "hub" if i % 2 == 0 else "tail",
+            "gold": [(r["source"], r["relation"], r["target"]) for r in gold],
+        })
+    return queries
+
+
+# -------------------------------------------------------------------
+# Retrievers under test
+# -------------------------------------------------------------------
+def _exact_search(name: str) -> List[Dict]:
+    """Seed lookup by exact name, so recall is measured from the queried entity itself."""
+    with get_driver().session() as s:
+        return s.run(
+            "MATCH (e:Entity {name:$name}) RETURN e.name as name, id(e) as id, e.community as community",
+            name=name,
+        ).data()
+
+
+def _graph_retriever(k_hop: int, token_budget: int | None) -> Callable[[str], Tuple[set, int]]:
+    def run(query: str) -> Tuple[set, int]:
+        ents, subgraphs = retrieve_subgraphs([query], k_hop=k_hop, search=_exact_search)
+        selected = pack_evidence(ents, subgraphs, token_budget=token_budget)
+        rows = sum(len(sg.get("entities", [])) + len(sg.get("rels", [])) for sg in subgraphs.values())
+        return {(c.src, c.rel, c.tgt) for c in selected}, rows
+    return run
+
+
+def _chunk_retriever(k_hop: int) -> Callable[[str], Tuple[set, int]]:
+    def run(query: str) -> Tuple[set, int]:
+        rows = k_hop_chunks(query, k=k_hop)
+        return {r.get("cid") for r in rows}, len(rows)
+    return run
+
+
+class _BowIndex:
+    """Vector-only baseline: TF-IDF cosine over chunk text, no graph."""
+
+    def __init__(self, chunks: List[Dict]):
+        self.ids = [c["chunk"]["id"] for c in chunks]
+        self.rels = [c["relations"] for c in chunks]
+        docs = [Counter(c["chunk"]["text"].lower().replace(".", " ").split()) for c in chunks]
+        df = Counter(t for d in docs for t in d)
+        n = len(docs)
+        self.idf = {t: math.log((n + 1) / (c + 1)) + 1 for t, c in df.items()}
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for i, d in enumerate(docs):
+            vec = {t: tf * self.idf[t] for t, tf in d.items()}
+            norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+            for t, v in vec.items():
+                self.postings[t].append((i, v / norm))
+
+    def search(self, query: str, k: int) -> List[int]:
+        scores: Dict[int, float] = defaultdict(float)
+        for t in query.lower().split():
+            w = self.idf.get(t, 0.0)
+            for i, v in self.postings.get(t, []):
+                scores[i] += w * v
+        return [i for i, _ in sorted(scores.items(), key=lambda x: -x[1])[:k]]
+
+
+def _vector_retriever(g: SyntheticGraph, top_k: int) -> Callable[[str], Tuple[set, int]]:
+    index = _BowIndex(g.chunks)
+
+    def run(query: str) -> Tuple[set, int]:
+        hits = index.search(query, top_k)
+        found = {(r["source"], r["relation"], r["target"]) for i in hits for r in index.rels[i]}
+        return found, len(hits)
+    return run
+
+
+# -------------------------------------------------------------------
+# Replay + report
+# -------------------------------------------------------------------
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, max(0, math.ceil(p / 100 * len(s)) - 1))]
+
+
+def replay(name: str, retriever: Callable[[str], Tuple[set, int]], queries: List[Dict], score_recall: bool = True) -> Dict:
+    lat, rows, recall = [], [], []
+    by_kind: Dict[str, List[float]] = defaultdict(list)
+    for q in queries:
+        start = time.perf_counter()
+        found, n_rows = retriever(q["query"])
+        took = (time.perf_counter() - start) * 1000
+        lat.append(took)
+        rows.append(n_rows)
+        by_kind[q["kind"]].append(took)
+        if score_recall and q["gold"]:
+            recall.append(len(set(map(tuple, q["gold"])) & found) / len(q["gold"]))
+    report = {
+        "queries": len(queries),
+        "latency_ms": {
+            "p50": round(_percentile(lat, 50), 2),
+            "p95": round(_percentile(lat, 95), 2),
+            "p99": round(_percentile(lat, 99), 2),
+            "mean": round(sum(lat) / len(lat), 2) if lat else 0.0,
+        },
+        "latency_ms_p50_by_kind": {k: round(_percentile(v, 50), 2) for k, v in sorted(by_kind.items())},
+        "rows_fetched_mean": round(sum(rows) / len(rows), 1) if rows else 0.0,
+    }
+    if score_recall:
+        report["recall_mean"] = round(sum(recall) / len(recall), 4) if recall else 0.0
+    log.info(f"[{name}] {report}")
+    return report
+
+
+def run_benchmark(scale: str = "small",
+                  n_queries: int = 100,
+                  k_hop: int = 1,
+                  token_budget: int | None = None,
+                  vector_top_k: int = 5,
+                  skip_load: bool = False,
+                  keep: bool = False) -> Dict:
+    g = generate_graph(scale)
+    load_s = 0.0 if skip_load else load_graph(g)
+    queries = build_queries(g, n_queries)
+    budget = token_budget or get_config().context_token_budget
+    try:
+        results = {
+            "graph_evidence": replay("graph_evidence", _graph_retriever(k_hop, budget), queries),
+            "k_hop_chunks": replay("k_hop_chunks", _chunk_retriever(k_hop), queries, score_recall=False),
+            "vector_baseline": replay("vector_baseline", _vector_retriever(g, vector_top_k), queries),
+        }
+    finally:
+        if not keep:
+            drop_graph(g)
+    return {
+        "scale": scale,
+        "entities": len(g.entities),
+        "relations": len(g.relations),
+        "chunks": len(g.chunks),
+        "k_hop": k_hop,
+        "token_budget": budget,
+        "vector_top_k": vector_top_k,
+        "load_seconds": round(load_s, 2),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="GraphRAG retrieval benchmark")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k-hop", type=int, default=1)
+    parser.add_argument("--token-budget", type=int, default=None)
+    parser.add_argument("--vector-top-k", type=int, default=5)
+    parser.add_argument("--skip-load", action="store_true", help="reuse a graph loaded by a previous run")
+    parser.add_argument("--keep", action="store_true",
+                        help="leave the synthetic graph in Neo4j for a later --skip-load run")
+    parser.add_argument("--out", type=Path, default=None, help="JSON output path (default data/cache/bench/)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    report = run_benchmark(
+        scale=args.scale, n_queries=args.queries, k_hop=args.k_hop, token_budget=args.token_budget,
+        vector_top_k=args.vector_top_k, skip_load=args.skip_load, keep=args.keep,
+    )
+    out = args.out or get_config().cache_dir / "bench" / f"{args.scale}_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, sort_keys=True), encoding="utf-8")
+    print(json.dumps(report["results"], indent=2, sort_keys=True))
+    print(f"Saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Content-addressed, compressed store for chunk text outside Neo4j.
+
+Each text is compressed as its own zstd frame (zlib if `zstandard` is not
+installed) and appended to the current segment file; an append-only index maps
+the text's hash to (segment, offset, length, codec). Reads go through mmap, and
+`get_many` serves a whole batch with one pass over each segment it touches.
+Identical texts are stored once.
+
+Several processes may share a store (the app, maintenance jobs, the benchmark
+loader): appends take an OS lock on the store directory, offsets come from the
+segment's size under that lock, and each process picks up entries written by
+the others from the index tail when it meets a key it does not know yet.
+"""
+from __future__ import annotations
+import hashlib
+import logging
+import mmap
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+try:
+    import zstandard as zstd
+except Exception:
+    zstd = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+log = logging.getLogger("blob_store")
+
+_INDEX_FILE = "index.tsv"
+_LOCK_FILE = "LOCK"
+_SEG_SUFFIX = ".blob"
+
+
+class BlobRef(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+    codec: str
+
+
+def blob_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class _FileLock:
+    """Exclusive inter-process lock on a file (flock, or msvcrt on Windows)."""
+
+    def __init__(self, path: Path):
+        self._fh = open(path, "a+b")
+
+    def __enter__(self):
+        if fcntl:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class BlobStore:
+    def __init__(self, root: Path, segment_bytes: int = 64_000_000, level: int = 3):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.codec = "zstd" if zstd else "zlib"
+        if not zstd:
+            log.warning("zstandard is not installed; compressing chunk text with zlib.")
+        self._level = level
+        self._lock = threading.Lock()
+        self._file_lock = _FileLock(self.root / _LOCK_FILE)
+        self._index: Dict[str, BlobRef] = {}
+        self._index_pos = 0
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._load_index()
+
+        segs = sorted(int(p.stem) for p in self.root.glob(f"*{_SEG_SUFFIX}") if p.stem.isdigit())
+        self._active = segs[-1] if segs else 1
+        self._fh, self._fh_seg = open(self._seg_path(self._active), "ab"), self._active
+        self._index_fh = open(self.root / _INDEX_FILE, "ab")
+
+    def _seg_path(self, n: int) -> Path:
+        return self.root / f"{n:08d}{_SEG_SUFFIX}"
+
+    def _load_index(self) -> None:
+        """Read index lines appended since the last call (by this or another process)."""
+        path = self.root / _INDEX_FILE
+        if not path.exists():
+            return
+        added = 0
+        with open(path, "rb") as fh:
+            fh.seek(self._index_pos)
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    break  # line still being written, or torn by a crash; re-read next time
+                self._index_pos += len(raw)
+                parts = raw.decode("utf-8", errors="replace").rstrip("\n").split("\t")
+                try:
+                    key, seg, off, length, codec = parts
+                    self._index[key] = BlobRef(int(seg), int(off), int(length), codec)
+                except ValueError:
+                    continue  # torn line from a crash, terminated by the next writer
+                added += 1
+        if added:
+            log.info(f"Loaded {added} blob index entries ({len(self._index)} total)")
+
+    # ---------------------------------------------------------------
+    # Codec
+    # ---------------------------------------------------------------
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstd.ZstdCompressor(level=self._level).compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zstd":
+            if zstd is None:
+                raise RuntimeError("Blob was written with zstd but the zstandard package is not installed.")
+            return zstd.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    # ---------------------------------------------------------------
+    # Writes
+    # ---------------------------------------------------------------
+    def put(self, text: str) -> str:
+        """Store text (once per distinct content) and return its key."""
+        key = blob_key(text)
+        if key in self._index:
+            return key
+        frame = self._compress(text.encode("utf-8"))
+        with self._lock, self._file_lock:
+            self._load_index()  # another process may have stored it meanwhile
+            if key in self._index:
+                return key
+            while self._seg_path(self._active + 1).exists():  # rotated by another process
+                self._active += 1
+            if self._fh_seg != self._active:
+                self._fh.close()
+                self._fh, self._fh_seg = open(self._seg_path(self._active), "ab"), self._active
+            size = os.fstat(self._fh.fileno()).st_size
+            if size and size + len(frame) > self.segment_bytes:
+                self._fh.close()
+                self._active += 1
+                self._fh, self._fh_seg = open(self._seg_path(self._active), "ab"), self._active
+                size = 0
+            offset = size
+            self._fh.write(frame)
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            ref = BlobRef(self._active, offset, len(frame), self.codec)
+            # index line last: a crash before it leaves an unreferenced frame, never a dangling key
+            index_end = os.fstat(self._index_fh.fileno()).st_size
+            line = f"{key}\t{ref.segment}\t{ref.offset}\t{ref.length}\t{ref.codec}\n".encode("utf-8")
+            if index_end > self._index_pos:
+                line = b"\n" + line  # terminate a torn line left by a crashed writer
+            self._index_fh.write(line)
+            self._index_fh.flush()
+            self._index_pos = index_end + len(line)
+            self._index[key] = ref
+        return key
+
+    # ---------------------------------------------------------------
+    # Reads
+    # ---------------------------------------------------------------
+    def _map(self, seg: int, need: int) -> mmap.mmap:
+        """mmap of a segment covering at least `need` bytes (remapped if the segment grew)."""
+        m = self._maps.get(seg)
+        if m is None or len(m) < need:
+            if m is not None:
+                m.close()
+            with open(self._seg_path(seg), "rb") as fh:
+                m = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[seg] = m
+        return m
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Fetch many texts, reading each touched segment in offset order."""
+        keys = {k for k in keys if k}
+        out: Dict[str, str] = {}
+        with self._lock:
+            if any(k not in self._index for k in keys):
+                self._load_index()  # written by another process since we last looked
+            refs = sorted(
+                ((k, self._index[k]) for k in keys if k in self._index),
+                key=lambda kv: (kv[1].segment, kv[1].offset),
+            )
+            for key, ref in refs:
+                m = self._map(ref.segment, ref.offset + ref.length)
+                out[key] = self._decompress(m[ref.offset:ref.offset + ref.length], ref.codec).decode("utf-8")
+        return out
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def stats(self) -> Dict:
+        segs = sorted(self.root.glob(f"*{_SEG_SUFFIX}"))
+        return {
+            "blobs": len(self._index),
+            "segments": len(segs),
+            "bytes_on_disk": sum(p.stat().st_size for p in segs),
+            "codec": self.codec,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+            self._index_fh.close()
+            self._file_lock.close()
+            for m in self._maps.values():
+                m.close()
+            self._maps.clear()
+
+
+def get_blob_store() -> BlobStore:
+    from pipeline.resources import get_config, shared
+    return shared("blob_store", lambda: BlobStore(get_config().cache_dir / "chunks"))
+
+
+def fetch_texts(keys: List[str]) -> Dict[str, str]:
+    """Bulk text lookup by key for the chunks that made it into a context."""
+    return get_blob_store().get_many(keys) if keys else {}
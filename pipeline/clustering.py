@@ -1,28 +1,27 @@
 # pipeline/clustering.py
 from __future__ import annotations
 from typing import List, Tuple
-import igraph as ig
-import leidenalg as la
 import logging
-from neo4j import GraphDatabase
 
-from config.config import load_config
+from pipeline.resources import get_config, get_driver
 from pipeline.llm_client_gemini import gemini_complete
 
-_cfg = load_config()
-_drv = GraphDatabase.driver(_cfg.neo4j.uri, auth=(_cfg.neo4j.user, _cfg.neo4j.password))
 log = logging.getLogger("neo4j")
 
 
 def _export_entities_and_edges():
-    """Export (id, name) nodes and (a, b, weight) edges from Neo4j."""
+    """
+    Export (id, name) nodes and (a, b, weight) edges from Neo4j.
+    Aggregated edges weigh in with conf_sum, i.e. what their parallel copies used to add up to.
+    Every Entity→Entity edge is a relation, whether RELATION or a native typed one.
+    """
     nodes, edges = [], []
-    with _drv.session() as s:
+    with get_driver().session() as s:
         for r in s.run("MATCH (e:Entity) RETURN id(e) as id, e.name as name"):
             nodes.append((r["id"], r["name"]))
         for r in s.run(
-            "MATCH (a:Entity)-[rel:RELATION]->(b:Entity) "
-            "RETURN id(a) as a, id(b) as b, coalesce(rel.confidence,1.0) as w"
+            "MATCH (a:Entity)-[rel]->(b:Entity) "
+            "RETURN id(a) as a, id(b) as b, coalesce(rel.conf_sum, rel.confidence, 1.0) as w"
         ):
             edges.append((r["a"], r["b"], r["w"]))
     log.info(f"Exported {len(nodes)} nodes and {len(edges)} edges from Neo4j.")
@@ -35,7 +34,10 @@ def run_leiden(resolution: float | None = None) -> int:
     Uses config-based resolution if not provided.
     Returns the number of unique communities.
     """
-    resolution = resolution or _cfg.leiden_resolution
+    import igraph as ig
+    import leidenalg as la
+
+    resolution = resolution or get_config().leiden_resolution
     log.info(f"Running Leiden clustering with resolution={resolution}")
 
     nodes, edges = _export_entities_and_edges()
@@ -68,7 +70,7 @@ def run_leiden(resolution: float | None = None) -> int:
         return 0
 
     idx2id = {v: k for k, v in id2idx.items()}
-    with _drv.session() as s:
+    with get_driver().session() as s:
         for i, comm in enumerate(membership):
             s.run("MATCH (e) WHERE id(e)=$id SET e.community=$c", id=idx2id[i], c=int(comm))
 
@@ -86,24 +88,24 @@ def summarize_communities() -> List[Tuple[int, str]]:
     q = """
     MATCH (e:Entity)
     WITH DISTINCT e.community AS comm
-    MATCH (a:Entity {community:comm})-[r:RELATION]->(b:Entity {community:comm})
-    WITH comm, collect({src:a.name, rel:type(r), tgt:b.name}) AS rels
+    MATCH (a:Entity {community:comm})-[r]->(b:Entity {community:comm})
+    WITH comm, collect({src:a.name, rel:coalesce(r.type, type(r)), tgt:b.name}) AS rels
     RETURN comm, rels
     """
     outputs: List[Tuple[int, str]] = []
-    with _drv.session() as s:
+    with get_driver().session() as s:
         data = s.run(q).data()
 
     for row in data:
         comm = row["comm"]
         rels = row.get("rels") or []
         lines = "\n".join(f"{x['src']} -[{x['rel']}]-> {x['tgt']}" for x in rels[:250]) or "(no edges)"
-        prompt_path = _cfg.prompts_dir / "community_report_graph.txt"
+        prompt_path = get_config().prompts_dir / "community_report_graph.txt"
         prompt = prompt_path.read_text(encoding="utf-8").replace("{community_data}", lines)
 
         try:
             summary = gemini_complete(prompt, max_tokens=400)
-            with _drv.session() as s:
+            with get_driver().session() as s:
                 s.run("MERGE (c:Community {id:$id}) SET c.summary=$s", id=int(comm), s=summary)
             outputs.append((int(comm), summary))
             log.info(f"Community {comm} summarized ({len(rels)} relations).")
@@ -1,42 +1,56 @@
 from __future__ import annotations
-from typing import Dict, List
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
 import logging
-import spacy
 
-from config.config import load_config
+from pipeline.resources import get_config, get_nlp
 from pipeline.utils import read_text, dedup_keep_order
-from pipeline.llm_client_local import generate_json
+from pipeline.llm_client_local import count_llm_tokens, generate_json
+from pipeline.preprocessing import count_tokens
+from pipeline.relation_extractor import extract_relations, normalize_relation_name
 
-_cfg = load_config()
 log = logging.getLogger("entity_extraction")
 
-# Load spaCy for candidate entity seeding
-try:
-    _nlp = spacy.load("en_core_web_sm")
-except Exception:
-    _nlp = None
+# spaCy NER labels → the entity types used in the graph
+_SPACY_TYPES = {
+    "PERSON": "PERSON", "ORG": "ORGANIZATION", "GPE": "GEO", "LOC": "GEO", "FAC": "GEO",
+    "NORP": "GROUP", "EVENT": "EVENT", "DATE": "DATE", "PRODUCT": "PRODUCT",
+    "WORK_OF_ART": "WORK", "LAW": "LAW",
+}
+_SUBJ_DEPS = {"nsubj", "nsubjpass"}
+_OBJ_DEPS = {"dobj", "attr", "dative", "oprd"}
+_RULE_CONFIDENCE = 0.6
 
 
 def spacy_candidates(text: str) -> List[str]:
     """Use spaCy to detect possible named entities or noun chunks as LLM seeds."""
-    if not _nlp:
+    nlp = get_nlp()
+    if not nlp:
         return []
-    ents = [e.text.strip() for e in _nlp(text).ents]
+    return _candidates_from_doc(nlp(text))
+
+
+def _candidates_from_doc(doc) -> List[str]:
+    ents = [e.text.strip() for e in doc.ents]
     if not ents:
-        ents = [c.text.strip() for c in _nlp(text).noun_chunks]
+        ents = [c.text.strip() for c in doc.noun_chunks]
     return dedup_keep_order([e for e in ents if e])
 
 
-def extract_graph(chunk_text: str, entity_types: str = "PERSON,ORGANIZATION,GEO") -> Dict:
+def extract_graph(chunk_text: str,
+                  entity_types: str = "PERSON,ORGANIZATION,GEO",
+                  seeds: Optional[List[str]] = None) -> Dict:
     """
     Extract entities and base relations from text using the local LLM.
     Expected model output: JSON with 'entities' and optional 'relations'.
+    `seeds` skips re-running spaCy when the caller already has candidates.
     """
-    tpl_path = _cfg.prompts_dir / "extract_graph.txt"
+    tpl_path = get_config().prompts_dir / "extract_graph.txt"
     tpl = read_text(tpl_path)
 
     # Use spaCy seeds to guide entity extraction
-    seeds = spacy_candidates(chunk_text)
+    if seeds is None:
+        seeds = spacy_candidates(chunk_text)
     seed_text = f"\n\nPay special attention to these possible entities: {', '.join(seeds)}" if seeds else ""
 
     # Fill the template prompt
@@ -65,3 +79,277 @@ def extract_graph(chunk_text: str, entity_types: str = "PERSON,ORGANIZATION,GEO"
     except Exception as e:
         log.error(f"Entity extraction failed: {e}")
         return {"entities": [], "relations": []}
+
+
+# -------------------------------------------------------------------
+# Extraction cascade: cheap spaCy pass first, LLM only when needed
+# -------------------------------------------------------------------
+@dataclass
+class RouteDecision:
+    route: str          # "skip" (nothing worth extracting) | "rules" (cheap pass is enough) | "llm"
+    reason: str
+    density: float      # distinct spaCy candidates (entities, else noun phrases) per 100 word tokens
+    confidence: float   # share of entities the dependency patterns connected
+    alpha_ratio: float  # share of tokens that are words
+
+
+def _entity_span(token, spans: Dict[int, object]):
+    """The entity span a token belongs to, following compound/flat modifiers to their head."""
+    for t in [token] + list(token.children):
+        if t.i in spans:
+            return spans[t.i]
+    return None
+
+
+def rule_extract(doc) -> Dict:
+    """
+    Cheap extraction from a parsed doc: NER entities plus subject-verb-object
+    relations where both ends are entities (including "X <verb> <prep> Y").
+    """
+    spans = {}
+    entities: Dict[str, Dict] = {}
+    for ent in doc.ents:
+        name = ent.text.strip()
+        if not name:
+            continue
+        for t in ent:
+            spans[t.i] = ent
+        entities.setdefault(name, {
+            "name": name,
+            "type": _SPACY_TYPES.get(ent.label_, ent.label_),
+            "description": "",
+        })
+
+    relations: List[Dict] = []
+    for tok in doc:
+        if tok.pos_ not in ("VERB", "AUX"):
+            continue
+        subj = [c for c in tok.children if c.dep_ in _SUBJ_DEPS]
+        objs = [(c, "") for c in tok.children if c.dep_ in _OBJ_DEPS]
+        for prep in (c for c in tok.children if c.dep_ in ("prep", "agent")):
+            objs += [(p, prep.lemma_) for p in prep.children if p.dep_ == "pobj"]
+        # copula: "Delhi is the capital of India" → attr carries the prep
+        for attr in (c for c, _ in objs if c.dep_ == "attr"):
+            for prep in (c for c in attr.children if c.dep_ == "prep"):
+                objs += [(p, f"{attr.lemma_} {prep.lemma_}") for p in prep.children if p.dep_ == "pobj"]
+
+        for s_tok in subj:
+            s_span = _entity_span(s_tok, spans)
+            if s_span is None:
+                continue
+            for o_tok, suffix in objs:
+                o_span = _entity_span(o_tok, spans)
+                if o_span is None or o_span == s_span:
+                    continue
+                verb = tok.lemma_ if tok.pos_ == "VERB" else ""
+                label = " ".join(x for x in (verb, suffix) if x) or "related to"
+                relations.append({
+                    "source": s_span.text.strip(),
+                    "target": o_span.text.strip(),
+                    "relation": normalize_relation_name(label),
+                    "evidence": tok.sent.text.strip(),
+                    "confidence": _RULE_CONFIDENCE,
+                })
+
+    return {"entities": list(entities.values()), "relations": relations}
+
+
+def route_chunk(doc, cheap: Dict) -> RouteDecision:
+    """Score a chunk from the cheap pass and decide whether the LLM is needed."""
+    cfg = get_config()
+    tokens = [t for t in doc if not t.is_space]
+    words = [t for t in tokens if t.is_alpha]
+    alpha_ratio = len(words) / max(1, len(tokens))
+    n_ents = len(cheap["entities"])
+    # candidates counted the way spacy_candidates seeds the LLM: entities, else noun phrases
+    n_cands = len(_candidates_from_doc(doc))
+    density = 100.0 * n_cands / max(1, len(words))
+
+    linked = {r["source"] for r in cheap["relations"]} | {r["target"] for r in cheap["relations"]}
+    confidence = len(linked & {e["name"] for e in cheap["entities"]}) / n_ents if n_ents else 0.0
+
+    if not words or alpha_ratio < cfg.cascade_min_alpha_ratio:
+        return RouteDecision("skip", "mostly non-word tokens (tables, TOC, code)", density, confidence, alpha_ratio)
+    if n_cands == 0:
+        return RouteDecision("skip", "no entities or noun phrases", density, confidence, alpha_ratio)
+    if n_ents == 0 and density < cfg.cascade_min_density:
+        return RouteDecision("skip", "no named entities and few noun phrases", density, confidence, alpha_ratio)
+    if n_ents <= cfg.cascade_rules_max_entities and confidence >= cfg.cascade_rules_confidence:
+        return RouteDecision("rules", "dependency patterns cover the entities", density, confidence, alpha_ratio)
+    return RouteDecision("llm", "needs model extraction", density, confidence, alpha_ratio)
+
+
+def _cheap_route(chunk_text: str):
+    """Run the cheap pass on one chunk. Returns (decision, doc or None, cheap result or None)."""
+    nlp = get_nlp()
+    if not get_config().cascade_enabled or not nlp:
+        return RouteDecision("llm", "cascade disabled or spaCy unavailable", 0.0, 0.0, 0.0), None, None
+    doc = nlp(chunk_text)
+    cheap = rule_extract(doc)
+    return route_chunk(doc, cheap), doc, cheap
+
+
+def cascade_extract(chunk_text: str, run_relations: bool = True) -> Dict:
+    """
+    Extract a chunk through the cascade. Returns {"entities", "relations", "routing"}
+    where routing records the decision and its scores. Chunks the cheap pass can
+    handle (or that hold nothing worth extracting) never reach the LLM; with the
+    cascade disabled or spaCy unavailable every chunk goes to the LLM.
+    """
+    return cascade_extract_many([chunk_text], run_relations=run_relations)[0]
+
+
+def cascade_extract_many(chunk_texts: List[str], run_relations: bool = True) -> List[Dict]:
+    """
+    Cascade over several chunks; results are aligned with `chunk_texts`.
+    LLM-routed chunks small enough to share a prompt are packed together
+    (see extract_graph_packed). With `run_relations`, every LLM-extracted chunk,
+    packed or not, then gets pair-conditioned relation refinement.
+    """
+    cfg = get_config()
+    results: List[Dict] = [{} for _ in chunk_texts]
+    single: List[int] = []
+    small: List[int] = []
+
+    for i, text in enumerate(chunk_texts):
+        decision, doc, cheap = _cheap_route(text)
+        log.info(
+            f"Cascade chunk {i}: route={decision.route} ({decision.reason}; density={decision.density:.2f}, "
+            f"confidence={decision.confidence:.2f}, alpha={decision.alpha_ratio:.2f})"
+        )
+        results[i] = {"entities": [], "relations": [], "routing": asdict(decision)}
+        if decision.route == "rules":
+            results[i].update(entities=cheap["entities"], relations=cheap["relations"])
+        elif decision.route == "llm":
+            results[i]["_seeds"] = _candidates_from_doc(doc) if doc is not None else None
+            results[i]["_doc"] = doc
+            if cfg.pack_small_chunks and count_tokens(text) <= cfg.pack_max_chunk_tokens:
+                small.append(i)
+            else:
+                single.append(i)
+
+    packs = plan_packs([chunk_texts[i] for i in small]) if len(small) > 1 else [[j] for j in range(len(small))]
+    for pack in packs:
+        idx = [small[j] for j in pack]
+        if len(idx) == 1:
+            single.append(idx[0])
+            continue
+        packed = extract_graph_packed([chunk_texts[i] for i in idx], seeds=[results[i].get("_seeds") for i in idx])
+        for i, data in zip(idx, packed):
+            results[i].update(entities=data["entities"], relations=data["relations"])
+            results[i]["routing"]["packed_with"] = len(idx)
+
+    for i in sorted(single):
+        graph_data = extract_graph(chunk_texts[i], seeds=results[i].get("_seeds"))
+        results[i].update(entities=graph_data.get("entities", []), relations=graph_data.get("relations", []))
+
+    if run_relations:
+        for i in sorted(set(small) | set(single)):
+            if results[i]["entities"]:
+                results[i]["relations"] = results[i]["relations"] + extract_relations(
+                    chunk_texts[i],
+                    entities=results[i]["entities"],
+                    known_relations=results[i]["relations"],
+                    doc=results[i].get("_doc"),
+                )
+
+    for r in results:
+        r.pop("_seeds", None)
+        r.pop("_doc", None)
+    return results
+
+
+# -------------------------------------------------------------------
+# Packing: several small chunks share one extraction prompt
+# -------------------------------------------------------------------
+_PACK_MARGIN_TOKENS = 64  # [INST] wrapper + tokenizer drift
+
+
+def _pack_block(i: int, text: str) -> str:
+    return f"<<<CHUNK {i}>>>\n{text}\n<<<END CHUNK {i}>>>"
+
+
+def plan_packs(chunk_texts: List[str]) -> List[List[int]]:
+    """
+    Greedily group chunk indices so each packed prompt plus its expected output
+    fits the local model's n_ctx, measured with the model's own tokenizer.
+    """
+    cfg = get_config()
+    tpl = read_text(cfg.prompts_dir / "extract_graph_packed.txt")
+    base = count_llm_tokens(tpl) + _PACK_MARGIN_TOKENS
+    per_out = cfg.pack_output_tokens_per_chunk
+    n_ctx = cfg.local_llm.n_ctx
+
+    packs: List[List[int]] = []
+    cur: List[int] = []
+    used = base
+    for i, text in enumerate(chunk_texts):
+        cost = count_llm_tokens(_pack_block(len(cur), text) + "\n\n") + per_out
+        if cur and used + cost > n_ctx:
+            packs.append(cur)
+            cur, used = [], base
+            cost = count_llm_tokens(_pack_block(0, text) + "\n\n") + per_out
+        cur.append(i)
+        used += cost
+    if cur:
+        packs.append(cur)
+    log.info(f"Planned {len(packs)} packed prompts for {len(chunk_texts)} small chunks (n_ctx={n_ctx}).")
+    return packs
+
+
+def _rows_by_chunk(data) -> Dict[int, Dict]:
+    """Accept {"chunks": [{"chunk": n, ...}]}, a bare list of those, or {"n": {...}}."""
+    if isinstance(data, dict) and isinstance(data.get("chunks"), list):
+        data = data["chunks"]
+    rows: Dict[int, Dict] = {}
+    if isinstance(data, list):
+        for row in data:
+            if isinstance(row, dict):
+                try:
+                    rows[int(row.get("chunk"))] = row
+                except (TypeError, ValueError):
+                    continue
+    elif isinstance(data, dict):
+        for k, row in data.items():
+            if isinstance(row, dict) and str(k).isdigit():
+                rows[int(k)] = row
+    return rows
+
+
+def extract_graph_packed(chunk_texts: List[str],
+                         entity_types: str = "PERSON,ORGANIZATION,GEO",
+                         seeds: Optional[List[Optional[List[str]]]] = None) -> List[Dict]:
+    """
+    Extract several small chunks with one LLM call. The output is keyed by chunk
+    index and returned aligned with `chunk_texts`; chunks the model left out are
+    re-extracted on their own (reusing their `seeds` when given).
+    """
+    cfg = get_config()
+    tpl = read_text(cfg.prompts_dir / "extract_graph_packed.txt")
+    blocks = "\n\n".join(_pack_block(i, t) for i, t in enumerate(chunk_texts))
+    prompt = tpl.replace("{entity_types}", entity_types).replace("{input_text}", blocks)
+    max_tokens = max(
+        cfg.pack_output_tokens_per_chunk,
+        min(cfg.pack_output_tokens_per_chunk * len(chunk_texts), cfg.local_llm.n_ctx - count_llm_tokens(prompt) - _PACK_MARGIN_TOKENS),
+    )
+
+    log.info(f"Running packed extraction LLM over {len(chunk_texts)} chunks (max_tokens={max_tokens})...")
+    try:
+        rows = _rows_by_chunk(generate_json(prompt, max_tokens=max_tokens))
+    except Exception as e:
+        log.error(f"Packed extraction failed: {e}")
+        rows = {}
+
+    out: List[Dict] = []
+    for i, text in enumerate(chunk_texts):
+        row = rows.get(i)
+        if row is None:
+            log.warning(f"Packed output missing chunk {i}; extracting it on its own.")
+            out.append(extract_graph(text, entity_types, seeds=seeds[i] if seeds else None))
+            continue
+        out.append({
+            "entities": [e for e in row.get("entities", []) or [] if e],
+            "relations": [r for r in row.get("relations", []) or [] if isinstance(r, dict)],
+        })
+    log.info(f"Packed extraction returned {len(rows)}/{len(chunk_texts)} chunks.")
+    return out
@@ -2,20 +2,35 @@ from __future__ import annotations
 import logging
 from typing import Dict, List
 from pipeline.neo4j_client import store_chunk_with_graph
+from pipeline.resources import get_config
+from pipeline.spool import spool_chunk
 
 log = logging.getLogger("graph_builder")
 
-def build_and_store_graph(chunk_id: str, chunk_text: str, entities: List[Dict], relations: List[Dict], source: str = "user_text"):
-    """Merge entities and relations into a single graph chunk and push to Neo4j."""
+def build_and_store_graph(chunk_id: str, chunk_text: str, entities: List[Dict], relations: List[Dict],
+                          source: str = "user_text", route: str | None = None, routing: Dict | None = None):
+    """
+    Merge entities and relations into a single graph chunk and push to Neo4j.
+    With the write spool enabled the result is appended to the local spool and
+    stored by the background replayer, so Neo4j latency or downtime never blocks
+    (or loses) extraction. `routing` is the cascade decision (route and scores).
+    """
     try:
         chunk_obj = {
             "id": chunk_id,
             "text": chunk_text,
-            "source": source
+            "source": source,
+            "route": (routing or {}).get("route", route),
+            "route_density": (routing or {}).get("density"),
+            "route_confidence": (routing or {}).get("confidence"),
         }
         log.info(f"Building graph chunk {chunk_id}: {len(entities)} entities, {len(relations)} relations")
-        store_chunk_with_graph(chunk_obj, entities, relations)
-        log.info(f"Successfully stored graph chunk {chunk_id}")
+        if get_config().use_write_spool:
+            spool_chunk(chunk_obj, entities, relations)
+            log.info(f"Spooled graph chunk {chunk_id}")
+        else:
+            store_chunk_with_graph(chunk_obj, entities, relations)
+            log.info(f"Successfully stored graph chunk {chunk_id}")
     except Exception as e:
         log.error(f"Failed to store chunk {chunk_id}: {e}")
         raise
@@ -0,0 +1,221 @@
+"""
+Background ingestion jobs.
+
+The Streamlit script only submits a job and polls it; extraction and storage run
+on a small worker pool owned by the process, so the UI stays responsive, jobs
+survive page refreshes, and several users can queue work. Jobs are picked by
+priority (lower runs first, FIFO within a priority) subject to a per-owner
+concurrency limit so one user cannot occupy every worker.
+"""
+from __future__ import annotations
+import heapq
+import itertools
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional
+
+from pipeline.entity_extraction import cascade_extract_many
+from pipeline.graph_builder import build_and_store_graph
+from pipeline.preprocessing import chunk_tokens, split_documents
+from pipeline.resources import get_config, shared
+
+log = logging.getLogger("jobs")
+
+# Short documents are extracted in batches so they can be packed into shared prompts;
+# full-size chunks go one at a time so progress is reported per chunk.
+_PACKED_BATCH = 16
+
+
+@dataclass
+class Job:
+    id: str
+    owner: str
+    text: str
+    priority: int = 5
+    run_relations: bool = True
+    short_docs: bool = False
+    status: str = "queued"  # queued | running | done | failed | cancelled
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    total_chunks: int = 0
+    done_chunks: int = 0
+    entities: int = 0
+    relations: int = 0
+    failed_chunks: int = 0
+    routes: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+    _cancel: bool = False
+    # guards the progress counters: the worker updates them while the UI reads
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def progress(self) -> Dict:
+        """Snapshot for the UI: fraction done, chunks/s and ETA in seconds."""
+        with self._lock:
+            snap = {f.name: getattr(self, f.name) for f in fields(self) if f.name not in ("text", "_cancel", "_lock")}
+            snap["routes"] = dict(self.routes)
+        elapsed = ((snap["finished_at"] or time.time()) - snap["started_at"]) if snap["started_at"] else 0.0
+        rate = snap["done_chunks"] / elapsed if elapsed > 0 else 0.0
+        remaining = snap["total_chunks"] - snap["done_chunks"]
+        snap.update(
+            fraction=snap["done_chunks"] / snap["total_chunks"] if snap["total_chunks"] else 0.0,
+            elapsed_s=round(elapsed, 1),
+            chunks_per_s=round(rate, 3),
+            eta_s=round(remaining / rate, 1) if rate > 0 and snap["status"] == "running" else None,
+        )
+        return snap
+
+
+class JobScheduler:
+    def __init__(self, workers: int = 2, max_running_per_owner: int = 1, keep_finished: int = 200):
+        self.max_running_per_owner = max_running_per_owner
+        self.keep_finished = keep_finished
+        self._jobs: Dict[str, Job] = {}
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._running_by_owner: Dict[str, int] = {}
+        self._cv = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"ingest-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+        log.info(f"Job scheduler started with {workers} workers (max {max_running_per_owner} running per owner)")
+
+    # ---------------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------------
+    def submit(self, text: str, owner: str, priority: int = 5, run_relations: bool = True, short_docs: bool = False) -> str:
+        job = Job(
+            id=uuid.uuid4().hex[:12], owner=owner, text=text, priority=priority,
+            run_relations=run_relations, short_docs=short_docs,
+        )
+        with self._cv:
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (priority, next(self._seq), job.id))
+            self._cv.notify()
+        log.info(f"Queued job {job.id} for owner={owner} (priority={priority}, {len(text)} chars)")
+        return job.id
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or stop a running one after its current batch."""
+        with self._cv:
+            job = self._jobs.get(job_id)
+            if not job or job.status not in ("queued", "running"):
+                return False
+            job._cancel = True
+            if job.status == "queued":
+                job.status, job.finished_at = "cancelled", time.time()
+            return True
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        job = self._jobs.get(job_id)
+        return job.progress() if job else None
+
+    def list_jobs(self, owner: str | None = None) -> List[Dict]:
+        with self._cv:
+            jobs = [j for j in self._jobs.values() if owner is None or j.owner == owner]
+        return [j.progress() for j in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    def queue_depth(self) -> int:
+        with self._cv:
+            return sum(1 for j in self._jobs.values() if j.status == "queued")
+
+    # ---------------------------------------------------------------
+    # Scheduling
+    # ---------------------------------------------------------------
+    def _next_job(self) -> Job:
+        """Block until a runnable job exists: highest priority whose owner is under its limit."""
+        with self._cv:
+            while True:
+                skipped = []
+                job = None
+                while self._queue:
+                    item = heapq.heappop(self._queue)
+                    cand = self._jobs.get(item[2])
+                    if cand is None or cand.status != "queued":
+                        continue
+                    if self._running_by_owner.get(cand.owner, 0) >= self.max_running_per_owner:
+                        skipped.append(item)
+                        continue
+                    job = cand
+                    break
+                for item in skipped:
+                    heapq.heappush(self._queue, item)
+                if job:
+                    job.status, job.started_at = "running", time.time()
+                    self._running_by_owner[job.owner] = self._running_by_owner.get(job.owner, 0) + 1
+                    return job
+                self._cv.wait()
+
+    def _finish(self, job: Job) -> None:
+        with self._cv:
+            job.finished_at = time.time()
+            self._running_by_owner[job.owner] -= 1
+            self._prune()
+            self._cv.notify_all()  # an owner slot freed up
+
+    def _prune(self) -> None:
+        finished = sorted(
+            (j for j in self._jobs.values() if j.status in ("done", "failed", "cancelled")),
+            key=lambda j: j.finished_at or 0,
+        )
+        for j in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[j.id]
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            try:
+                run_ingestion(job)
+                job.status = "cancelled" if job._cancel else "done"
+                log.info(f"Job {job.id} {job.status}: {job.done_chunks}/{job.total_chunks} chunks")
+            except Exception as e:
+                job.status, job.error = "failed", str(e)
+                log.error(f"Job {job.id} failed: {e}")
+            finally:
+                job.text = ""  # free the input once processed
+                self._finish(job)
+
+
+def run_ingestion(job: Job) -> None:
+    """Chunk, extract and store one job's text, updating its progress per chunk."""
+    docs = split_documents(job.text) if job.short_docs else [job.text]
+    chunks = [c for d in docs for c in chunk_tokens(d)]
+    job.total_chunks = len(chunks)
+
+    step = _PACKED_BATCH if job.short_docs else 1
+    for start in range(0, len(chunks), step):
+        if job._cancel:
+            return
+        batch = chunks[start:start + step]
+        results = cascade_extract_many(batch, run_relations=job.run_relations)
+        for chunk, graph_data in zip(batch, results):
+            chunk_id = f"user_chunk_{uuid.uuid4().hex[:8]}"
+            entities = graph_data.get("entities", [])
+            relations = graph_data.get("relations", [])
+            route = graph_data["routing"]["route"]
+            try:
+                build_and_store_graph(chunk_id, chunk, entities, relations, routing=graph_data["routing"])
+                failed = 0
+            except Exception as e:
+                failed = 1
+                log.error(f"Job {job.id}: failed to store chunk {chunk_id}: {e}")
+            with job._lock:
+                job.failed_chunks += failed
+                job.routes[route] = job.routes.get(route, 0) + 1
+                job.entities += len(entities)
+                job.relations += len(relations)
+                job.done_chunks += 1
+
+
+def get_scheduler() -> JobScheduler:
+    cfg = get_config()
+    return shared(
+        "job_scheduler",
+        lambda: JobScheduler(workers=cfg.job_workers, max_running_per_owner=cfg.job_max_per_owner),
+    )
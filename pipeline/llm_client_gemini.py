@@ -1,8 +1,8 @@
 from __future__ import annotations
-import requests, time, logging
-from config.config import load_config
+import requests, time, logging, json
+from typing import Iterator
+from pipeline.resources import get_config
 
-_cfg = load_config()
 log = logging.getLogger("app")
 
 def gemini_complete(prompt: str,
@@ -10,16 +10,17 @@ def gemini_complete(prompt: str,
                     temperature: float | None = None,
                     retries: int = 3) -> str:
     """Gemini REST client with retries and safe parsing."""
-    if not _cfg.gemini.api_key or _cfg.gemini.api_key == "MISSING":
+    cfg = get_config()
+    if not cfg.gemini.api_key or cfg.gemini.api_key == "MISSING":
         raise RuntimeError("GEMINI_API_KEY missing. Set it in .env.")
 
-    model = _cfg.gemini.model
-    url = f"{_cfg.gemini.endpoint}/{model}:generateContent?key={_cfg.gemini.api_key}"
+    model = cfg.gemini.model
+    url = f"{cfg.gemini.endpoint}/{model}:generateContent?key={cfg.gemini.api_key}"
     body = {
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {
-            "maxOutputTokens": max_tokens or _cfg.gemini.max_output_tokens,
-            "temperature": temperature if temperature is not None else _cfg.gemini.temperature,
+            "maxOutputTokens": max_tokens or cfg.gemini.max_output_tokens,
+            "temperature": temperature if temperature is not None else cfg.gemini.temperature,
             "topP": 0.9,
             "topK": 40,
         },
@@ -54,3 +55,76 @@ def gemini_complete(prompt: str,
             time.sleep(1.5 * attempt)
 
     return "**Error:** Gemini could not process the request after multiple attempts."
+
+
+def _parts_text(data: dict) -> str:
+    cand = data.get("candidates") or []
+    if not cand:
+        return ""
+    parts = cand[0].get("content", {}).get("parts", []) or []
+    return "".join(p.get("text", "") for p in parts)
+
+
+def gemini_stream(prompt: str,
+                  max_tokens: int | None = None,
+                  temperature: float | None = None,
+                  retries: int = 3) -> Iterator[str]:
+    """
+    Stream a Gemini completion via streamGenerateContent (SSE), yielding text
+    deltas as they arrive. Retries only until the first delta has been yielded;
+    after that an error ends the stream with an error note. Problems are yielded
+    as messages rather than raised, so a streaming UI never shows a traceback.
+    The API key is only required for Google's endpoint (not for a local stub).
+    """
+    cfg = get_config()
+    has_key = bool(cfg.gemini.api_key) and cfg.gemini.api_key != "MISSING"
+    if not has_key and "googleapis.com" in cfg.gemini.endpoint:
+        log.error("GEMINI_API_KEY missing; cannot stream an answer.")
+        yield "**Error:** GEMINI_API_KEY missing. Set it in .env."
+        return
+
+    url = f"{cfg.gemini.endpoint}/{cfg.gemini.model}:streamGenerateContent?alt=sse"
+    if has_key:
+        url += f"&key={cfg.gemini.api_key}"
+    body = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "maxOutputTokens": max_tokens or cfg.gemini.max_output_tokens,
+            "temperature": temperature if temperature is not None else cfg.gemini.temperature,
+            "topP": 0.9,
+            "topK": 40,
+        },
+    }
+
+    for attempt in range(1, retries + 1):
+        started = False
+        try:
+            with requests.post(url, json=body, stream=True, timeout=(10, 60)) as r:
+                if r.status_code != 200:
+                    log.warning(f"Gemini stream HTTP {r.status_code}: {r.text[:200]}")
+                    time.sleep(1.5 * attempt)
+                    continue
+                r.encoding = "utf-8"  # SSE is always UTF-8; requests would assume ISO-8859-1
+                for raw in r.iter_lines(decode_unicode=True):
+                    if not raw or not raw.startswith("data:"):
+                        continue
+                    data = json.loads(raw[5:].strip())
+                    if "error" in data:
+                        yield f"**Gemini Error:** {data['error'].get('message','unknown')}"
+                        return
+                    text = _parts_text(data)
+                    if text:
+                        started = True
+                        yield text
+            if not started:
+                yield "**Empty text response.**"
+            return
+        except Exception as e:
+            if started:
+                log.error(f"Gemini stream broke mid-response: {e}")
+                yield "\n\n**Error:** response stream was interrupted."
+                return
+            log.warning(f"Gemini stream failed (attempt {attempt}): {e}")
+            time.sleep(1.5 * attempt)
+
+    yield "**Error:** Gemini could not process the request after multiple attempts."
@@ -1,79 +1,139 @@
 from __future__ import annotations
-from pathlib import Path
-from typing import Optional
+from typing import Dict, List
 import logging
+import threading
 import time
 import re, json
 
-from llama_cpp import Llama
-from config.config import load_config
+from pipeline.resources import get_config, get_llm, shared
 
-_cfg = load_config()
-_model: Optional[Llama] = None
 log = logging.getLogger("llm_local")
 
-
-def _get_model() -> Llama:
-    global _model
-    if _model is not None:
-        return _model
-
-    model_path = Path(_cfg.local_llm.model_dir) / _cfg.local_llm.model_file
-    log.info(f"Loading local LLM model from: {model_path}")
-
-    if not model_path.exists():
-        log.error(f"Local GGUF model not found: {model_path}")
-        raise FileNotFoundError(f"Local GGUF not found: {model_path}")
-
-    start = time.time()
-    try:
-        _model = Llama(
-            model_path=str(model_path),
-            n_ctx=_cfg.local_llm.n_ctx,
-            n_gpu_layers=_cfg.local_llm.n_gpu_layers,
-            verbose=_cfg.local_llm.verbose,
+# One llama.cpp context is shared process-wide and is not reentrant.
+_gen_lock = threading.RLock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _build_draft():
+    """Prompt-lookup draft 'model' that also counts how many tokens it proposed."""
+    from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+    class _CountingPromptLookup(LlamaPromptLookupDecoding):
+        def __init__(self, num_pred_tokens: int):
+            super().__init__(num_pred_tokens=num_pred_tokens)
+            self.calls = 0
+            self.drafted = 0
+
+        def __call__(self, input_ids, /, **kwargs):
+            draft = super().__call__(input_ids, **kwargs)
+            self.calls += 1
+            self.drafted += len(draft)
+            return draft
+
+    return _CountingPromptLookup(num_pred_tokens=get_config().local_llm.draft_tokens)
+
+
+def _get_model(speculative: bool | None = None):
+    """
+    Shared llama.cpp model, loaded once per process on first use.
+    `speculative` switches prompt-lookup decoding on/off for the next call
+    (None = LOCAL_SPECULATIVE); callers must hold _gen_lock while generating.
+    Turning it on needs a model loaded with LOCAL_SPECULATIVE=1 (logits for every position).
+    """
+    llm = get_llm()
+    if speculative is None:
+        speculative = get_config().local_llm.speculative
+    if speculative and not getattr(getattr(llm, "context_params", None), "logits_all", False):
+        log.warning("Speculative decoding requested but the model was loaded without LOCAL_SPECULATIVE=1; using standard decoding.")
+        speculative = False
+    llm.draft_model = shared("llm_draft", _build_draft) if speculative else None
+    return llm
+
+
+def count_llm_tokens(text: str) -> int:
+    """Exact prompt length under the local model's own tokenizer."""
+    return len(get_llm().tokenize(text.encode("utf-8"), add_bos=False))
+
+
+def _record(mode: str, completion_tokens: int, seconds: float, draft_calls: int, drafted: int) -> Dict[str, float]:
+    st = _stats.setdefault(mode, {"calls": 0, "completion_tokens": 0, "seconds": 0.0, "draft_calls": 0, "drafted": 0})
+    st["calls"] += 1
+    st["completion_tokens"] += completion_tokens
+    st["seconds"] += seconds
+    st["draft_calls"] += draft_calls
+    st["drafted"] += drafted
+    return st
+
+
+def generation_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Throughput per decoding mode ("standard" / "speculative"). Each verification step
+    yields one sampled token plus the accepted drafts, so accepted ≈ tokens - steps;
+    acceptance_rate is accepted / drafted.
+    """
+    out = {}
+    for mode, st in _stats.items():
+        accepted = max(0, st["completion_tokens"] - st["draft_calls"])
+        out[mode] = dict(
+            st,
+            tokens_per_s=st["completion_tokens"] / st["seconds"] if st["seconds"] else 0.0,
+            acceptance_rate=accepted / st["drafted"] if st["drafted"] else None,
         )
-        duration = time.time() - start
-        log.info(
-            f"Loaded model '{model_path.name}' "
-            f"(ctx={_cfg.local_llm.n_ctx}, gpu_layers={_cfg.local_llm.n_gpu_layers}) "
-            f"in {duration:.2f}s"
-        )
-    except Exception as e:
-        log.error(f"Failed to load model: {e}")
-        raise
+    return out
+
 
-    return _model
+def compare_speculative(prompts: List[str], max_tokens: int = 256) -> Dict[str, Dict[str, float]]:
+    """Run every prompt with speculative decoding off and on and return generation_stats()."""
+    _stats.clear()
+    for p in prompts:
+        for speculative in (False, True):
+            with _gen_lock:
+                get_llm().reset()  # no KV prefix reuse between the two runs
+                generate_json(p, max_tokens=max_tokens, speculative=speculative)
+    stats = generation_stats()
+    log.info(f"Speculative comparison over {len(prompts)} prompts: {stats}")
+    return stats
 
 
-def generate_json(prompt: str, max_tokens: int = 256) -> dict | list | str:
-    llm = _get_model()
+def generate_json(prompt: str, max_tokens: int = 256, speculative: bool | None = None) -> dict | list | str:
     full_prompt = f"""[INST] You are a precise information extraction model.
 Return ONLY valid JSON. Do not add commentary.
 
 {prompt} [/INST]"""
 
     log.debug(f"Generating JSON with max_tokens={max_tokens}")
-    start = time.time()
 
-    try:
-        out = llm(
-            full_prompt,
-            max_tokens=max_tokens,
-            temperature=0.0,
-            stop=["</s>"],
-        )
-    except Exception as e:
-        log.error(f"LLM generation failed: {e}")
-        return {"error": "generation_failed", "detail": str(e)}
+    with _gen_lock:
+        llm = _get_model(speculative)
+        draft = llm.draft_model
+        calls0, drafted0 = (draft.calls, draft.drafted) if draft else (0, 0)
+        start = time.time()
+        try:
+            out = llm(
+                full_prompt,
+                max_tokens=max_tokens,
+                temperature=0.0,
+                stop=["</s>"],
+            )
+        except Exception as e:
+            log.error(f"LLM generation failed: {e}")
+            return {"error": "generation_failed", "detail": str(e)}
+        duration = time.time() - start
+        draft_calls, drafted = (draft.calls - calls0, draft.drafted - drafted0) if draft else (0, 0)
 
-    duration = time.time() - start
     text = out["choices"][0]["text"]
+    n_out = int(out.get("usage", {}).get("completion_tokens", 0))
+    _record("speculative" if draft else "standard", n_out, duration, draft_calls, drafted)
+    if draft and drafted:
+        log.info(f"Speculative decoding: {drafted} drafted, ~{max(0, n_out - draft_calls)} accepted")
     print("=== RAW MODEL OUTPUT ===")
     print(text)
     print("=========================")
 
-    log.info(f"Model generation completed in {duration:.2f}s, output length={len(text)} chars")
+    log.info(
+        f"Model generation completed in {duration:.2f}s, output length={len(text)} chars, "
+        f"{n_out / duration if duration else 0.0:.1f} tok/s"
+    )
 
     m = re.search(r'(\{.*\}|\[.*\])', text, re.S)
     if not m:
@@ -87,3 +147,21 @@ Return ONLY valid JSON. Do not add commentary.
     except Exception as e:
         log.error(f"Invalid JSON format: {e}")
         return {"error": "invalid_json", "raw": text}
+
+
+if __name__ == "__main__":
+    # python -m pipeline.llm_client_local doc1.txt doc2.txt  (run with LOCAL_SPECULATIVE=1)
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Compare standard vs prompt-lookup speculative decoding on extraction prompts")
+    parser.add_argument("files", nargs="+", help="text files, each wrapped in the extract_graph prompt")
+    parser.add_argument("--max-tokens", type=int, default=768)
+    args = parser.parse_args()
+
+    tpl = (get_config().prompts_dir / "extract_graph.txt").read_text(encoding="utf-8")
+    prompts = [
+        tpl.replace("{entity_types}", "PERSON,ORGANIZATION,GEO").replace("{input_text}", Path(f).read_text(encoding="utf-8"))
+        for f in args.files
+    ]
+    print(json.dumps(compare_speculative(prompts, max_tokens=args.max_tokens), indent=2))
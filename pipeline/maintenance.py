@@ -0,0 +1,65 @@
+"""
+Graph maintenance jobs, runnable from the command line:
+
+    python -m pipeline.maintenance compact-relations
+    python -m pipeline.maintenance externalize-chunk-text
+    python -m pipeline.maintenance prune --dry-run
+    python -m pipeline.maintenance migrate-relation-types
+"""
+from __future__ import annotations
+import argparse
+import json
+import logging
+
+from pipeline.neo4j_client import (
+    PrunePolicy, compact_relations, externalize_chunk_texts, migrate_relation_types, prune_graph,
+)
+
+log = logging.getLogger("neo4j")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="GraphRAG graph maintenance jobs")
+    sub = parser.add_subparsers(dest="job", required=True)
+
+    p_compact = sub.add_parser("compact-relations", help="fold parallel RELATION edges into aggregated edges")
+    p_compact.add_argument("--batch-size", type=int, default=500)
+
+    p_ext = sub.add_parser("externalize-chunk-text", help="move inline Chunk.text into the compressed blob store")
+    p_ext.add_argument("--batch-size", type=int, default=500)
+
+    defaults = PrunePolicy.from_config()
+    p_prune = sub.add_parser("prune", help="delete expired chunks, weak relations and orphan entities")
+    p_prune.add_argument("--min-confidence", type=float, default=defaults.min_confidence)
+    p_prune.add_argument("--min-support", type=int, default=defaults.min_support)
+    p_prune.add_argument("--chunk-ttl-days", type=float, default=defaults.chunk_ttl_days)
+    p_prune.add_argument("--orphans", action=argparse.BooleanOptionalAction, default=defaults.orphans)
+    p_prune.add_argument("--orphan-max-mentions", type=int, default=defaults.orphan_max_mentions)
+    p_prune.add_argument("--batch-size", type=int, default=500)
+    p_prune.add_argument("--dry-run", action="store_true", help="report what would be deleted, change nothing")
+
+    p_mig = sub.add_parser("migrate-relation-types", help="rewrite RELATION edges as native typed relationships")
+    p_mig.add_argument("--batch-size", type=int, default=500)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    if args.job == "compact-relations":
+        print(json.dumps(compact_relations(batch_size=args.batch_size), indent=2, default=str))
+    elif args.job == "externalize-chunk-text":
+        print(json.dumps({"moved": externalize_chunk_texts(batch_size=args.batch_size)}, indent=2))
+    elif args.job == "prune":
+        policy = PrunePolicy(
+            min_confidence=args.min_confidence,
+            min_support=args.min_support,
+            chunk_ttl_days=args.chunk_ttl_days,
+            orphans=args.orphans,
+            orphan_max_mentions=args.orphan_max_mentions,
+        )
+        print(json.dumps(prune_graph(policy, batch_size=args.batch_size, dry_run=args.dry_run), indent=2, default=str))
+    elif args.job == "migrate-relation-types":
+        print(json.dumps(migrate_relation_types(batch_size=args.batch_size), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,14 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, List
 import logging
-from neo4j import GraphDatabase
-from config.config import load_config
+import threading
+import time
+from pipeline.blob_store import fetch_texts, get_blob_store
+from pipeline.relation_extractor import relationship_type
+from pipeline.resources import get_config, get_driver
 
-_cfg = load_config()
 log = logging.getLogger("neo4j")
 
-# Initialize Neo4j driver
-_driver = GraphDatabase.driver(
-    _cfg.neo4j.uri,
-    auth=(_cfg.neo4j.user, _cfg.neo4j.password)
-)
-
 
 @dataclass
 class Chunk:
@@ -22,6 +18,9 @@ class Chunk:
     id: str
     text: str
     source: str = "user_text"
+    route: str | None = None  # extraction cascade decision: skip | rules | llm
+    route_density: float | None = None     # cascade scores behind the decision
+    route_confidence: float | None = None
 
 
 def init_indexes():
@@ -31,15 +30,20 @@ def init_indexes():
     cyphers = [
         "CREATE CONSTRAINT entity_name_unique IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
         "CREATE INDEX chunk_id_idx IF NOT EXISTS FOR (c:Chunk) ON (c.id)",
-        "CREATE INDEX community_idx IF NOT EXISTS FOR (c:Community) ON (c.id)"
+        "CREATE INDEX chunk_created_idx IF NOT EXISTS FOR (c:Chunk) ON (c.created_at)",
+        "CREATE INDEX community_idx IF NOT EXISTS FOR (c:Community) ON (c.id)",
+        "CREATE INDEX relation_type_idx IF NOT EXISTS FOR ()-[r:RELATION]-() ON (r.type)",
+        "CREATE INDEX relation_confidence_idx IF NOT EXISTS FOR ()-[r:RELATION]-() ON (r.confidence)",
     ]
-    with _driver.session() as s:
+    with get_driver().session() as s:
         for c in cyphers:
             try:
                 s.run(c)
                 log.info(f"Executed index/constraint: {c}")
             except Exception as e:
                 log.warning(f"Failed to execute: {c} — {e}")
+    if get_config().typed_relations:
+        ensure_relation_type_indexes()
 
 
 def check_apoc() -> bool:
@@ -48,7 +52,7 @@ def check_apoc() -> bool:
     Returns True if available, False otherwise.
     """
     try:
-        with _driver.session() as s:
+        with get_driver().session() as s:
             result = s.run("RETURN apoc.version() AS version").single()
             if result and result["version"]:
                 log.info(f"[OK] APOC detected: {result['version']}")
@@ -61,60 +65,556 @@ def check_apoc() -> bool:
         return False
 
 
-def store_chunk_with_graph(chunk: Chunk | dict, entities: List[Dict] | List[str], relations: List[Dict]):
+def _aggregate_relations(relations: List[Dict]) -> List[Dict]:
     """
-    Efficiently insert one Chunk, its Entities, and Relations in a single transaction using UNWIND.
+    Collapse relations repeated within one chunk to a single row per
+    (source, relation, target), keeping the most confident evidence.
     """
-    if isinstance(chunk, dict):
-        chunk = Chunk(**chunk)
-
-    ent_dicts = [
-        e if isinstance(e, dict) else {"name": e, "type": "UNKNOWN", "description": ""}
-        for e in entities if e
-    ]
-
-    rel_dicts = [
-        {
+    merged: Dict[tuple, Dict] = {}
+    for r in relations:
+        if not (r.get("source") and r.get("target")):
+            continue
+        row = {
             "src": r.get("source"),
             "tgt": r.get("target"),
             "rel": r.get("relation", "RELATED_TO"),
             "ev": r.get("evidence", ""),
             "conf": float(r.get("confidence", 1.0) or 1.0),
         }
-        for r in relations if r.get("source") and r.get("target")
-    ]
+        key = (row["src"], row["rel"], row["tgt"])
+        if key not in merged or row["conf"] > merged[key]["conf"]:
+            merged[key] = row
+    return list(merged.values())
 
-    log.info(f"Storing chunk {chunk.id}: {len(ent_dicts)} entities, {len(rel_dicts)} relations")
 
-    q = """
-    MERGE (c:Chunk {id:$cid})
-      SET c.text=$text, c.source=$source, c.created_at=timestamp()
-    WITH c
-    UNWIND $entities AS e
-      MERGE (n:Entity {name:e.name})
-        ON CREATE SET n.type=e.type, n.description=e.description, n.first_seen=timestamp()
-      MERGE (n)-[:MENTIONED_IN]->(c)
-    WITH c
-    UNWIND $relations AS r
-      MERGE (a:Entity {name:r.src})
-      MERGE (b:Entity {name:r.tgt})
-      MERGE (a)-[rel:RELATION {type:r.rel, chunk_id:$cid}]->(b)
-        SET rel.confidence=r.conf, rel.evidence=r.ev
+_MAX_POSITIONS = 16
+
+# Idempotent: re-running it for the same chunk (e.g. spool replay) changes nothing.
+# Built from three parts so the property and typed schemas share the chunk /
+# entity writes and the relation aggregation and differ only in how the edge is merged.
+_STORE_CHUNK_HEAD = """
+MERGE (c:Chunk {id:$cid})
+  SET c.text=$text, c.text_id=$text_id, c.preview=$preview,
+      c.source=$source, c.route=$route, c.route_density=$route_density, c.route_confidence=$route_confidence,
+      c.created_at=coalesce(c.created_at, timestamp())
+FOREACH (e IN $entities |
+  MERGE (n:Entity {name:e.name})
+    ON CREATE SET n.type=e.type, n.description=e.description, n.first_seen=timestamp()
+  MERGE (n)-[m:MENTIONED_IN]->(c)
+    SET m.mentions=e.mentions, m.positions=e.positions
+)
+WITH c
+UNWIND $relations AS r
+  MERGE (a:Entity {name:r.src})
+  MERGE (b:Entity {name:r.tgt})
+"""
+
+_STORE_RELATION_AGG = """
+  WITH rel, r, NOT $cid IN coalesce(rel.chunk_ids, []) AS is_new
+  SET rel.evidence = CASE WHEN rel.evidence IS NULL OR r.conf >= coalesce(rel.confidence, 0.0)
+                          THEN r.ev ELSE rel.evidence END,
+      rel.confidence = CASE WHEN r.conf > coalesce(rel.confidence, 0.0)
+                            THEN r.conf ELSE rel.confidence END,
+      rel.support = coalesce(rel.support, 0) + CASE WHEN is_new THEN 1 ELSE 0 END,
+      rel.conf_sum = coalesce(rel.conf_sum, 0.0) + CASE WHEN is_new THEN r.conf ELSE 0.0 END,
+      rel.chunk_ids = CASE WHEN is_new
+                           THEN (coalesce(rel.chunk_ids, []) + $cid)[-$max_ids..]
+                           ELSE rel.chunk_ids END
+  SET rel.mean_confidence = rel.conf_sum / rel.support
+"""
+
+_STORE_CHUNK_Q = _STORE_CHUNK_HEAD + """
+  MERGE (a)-[rel:RELATION {type:r.rel}]->(b)
+    ON CREATE SET rel.support=0, rel.conf_sum=0.0, rel.confidence=0.0, rel.chunk_ids=[]
+""" + _STORE_RELATION_AGG
+
+# Typed schema: the relation name becomes the native relationship type (r.rtype,
+# sanitised by relationship_type); `type` is kept as a property so both schemas read alike.
+_STORE_CHUNK_TYPED_Q = _STORE_CHUNK_HEAD + """
+  WITH a, b, r
+  CALL apoc.merge.relationship(a, r.rtype, {},
+         {type:r.rel, support:0, conf_sum:0.0, confidence:0.0, chunk_ids:[]}, b, {}) YIELD rel
+""" + _STORE_RELATION_AGG
+
+
+def _mention_positions(text: str, name: str, max_positions: int = _MAX_POSITIONS) -> tuple[int, List[int]]:
+    """Case-insensitive occurrence count of `name` in `text` and the first char offsets."""
+    hay, needle = text.lower(), name.lower()
+    count, positions, i = 0, [], hay.find(needle)
+    while i >= 0 and needle:
+        count += 1
+        if len(positions) < max_positions:
+            positions.append(i)
+        i = hay.find(needle, i + len(needle))
+    return count, positions
+
+
+def _posting_entities(text: str, entities: List[Dict] | List[str], relations: List[Dict]) -> List[Dict]:
     """
+    One row per distinct entity mentioned in the chunk — listed entities plus
+    relation endpoints — with the mention count and positions for its posting.
+    """
+    rows: Dict[str, Dict] = {}
+    for e in entities:
+        if not e:
+            continue
+        row = dict(e) if isinstance(e, dict) else {"name": e, "type": "UNKNOWN", "description": ""}
+        name = str(row.get("name") or "").strip()
+        if name:
+            row["name"] = name
+            rows.setdefault(name, row)
+    for r in relations:
+        for name in (r.get("source"), r.get("target")):
+            if name and name not in rows:
+                rows[name] = {"name": name, "type": "UNKNOWN", "description": ""}
+    for row in rows.values():
+        row.setdefault("type", "UNKNOWN")
+        row.setdefault("description", "")
+        count, positions = _mention_positions(text, row["name"])
+        row["mentions"] = max(1, count)
+        row["positions"] = positions
+    return list(rows.values())
+
+
+def _chunk_params(chunk: Chunk | dict, entities: List[Dict] | List[str], relations: List[Dict]) -> Dict:
+    if isinstance(chunk, dict):
+        chunk = Chunk(**chunk)
+
+    cfg = get_config()
+    ent_dicts = _posting_entities(chunk.text, entities, relations)
+
+    # With the external store the node keeps only the blob key and a preview
+    text, text_id = chunk.text, None
+    if cfg.chunk_text_external:
+        text, text_id = None, get_blob_store().put(chunk.text)
+
+    rel_rows = _aggregate_relations(relations)
+    if cfg.typed_relations:
+        for r in rel_rows:
+            r["rtype"] = relationship_type(r["rel"])
+
+    return {
+        "cid": chunk.id,
+        "text": text,
+        "text_id": text_id,
+        "preview": chunk.text[:cfg.chunk_preview_chars],
+        "source": chunk.source,
+        "route": chunk.route,
+        "route_density": chunk.route_density,
+        "route_confidence": chunk.route_confidence,
+        "entities": ent_dicts,
+        "relations": rel_rows,
+        "max_ids": cfg.relation_max_chunk_ids,
+    }
+
+
+def _store_query() -> str:
+    return _STORE_CHUNK_TYPED_Q if get_config().typed_relations else _STORE_CHUNK_Q
+
+
+def store_chunk_with_graph(chunk: Chunk | dict, entities: List[Dict] | List[str], relations: List[Dict]):
+    """
+    Efficiently insert one Chunk, its Entities, and Relations in a single transaction using UNWIND.
+    Relations are aggregated: one edge per (source, type, target) carrying
+    support, max/mean confidence and a bounded list of supporting chunk ids.
+    The edge is a RELATION with a `type` property, or with TYPED_RELATIONS a
+    native relationship of that type.
+    MENTIONED_IN edges double as the entity→chunk posting lists (mentions, positions).
+    Re-storing the same chunk does not inflate support.
+    """
+    params = _chunk_params(chunk, entities, relations)
+    cid = params["cid"]
+    log.info(f"Storing chunk {cid}: {len(params['entities'])} entities, {len(params['relations'])} relations")
 
     try:
-        with _driver.session() as s:
-            s.run(
-                q,
-                cid=chunk.id,
-                text=chunk.text,
-                source=chunk.source,
-                entities=ent_dicts,
-                relations=rel_dicts
-            )
-        log.info(f"Chunk {chunk.id} stored successfully in Neo4j.")
+        with get_driver().session() as s:
+            s.run(_store_query(), **params)
+        _note_relation_types(params["relations"])
+        log.info(f"Chunk {cid} stored successfully in Neo4j.")
+    except Exception as e:
+        log.error(f"Failed to store chunk {cid}: {e}")
+        raise
+
+
+def store_chunks_bulk(records: List[Dict]):
+    """
+    Store many {chunk, entities, relations} records in one transaction.
+    Either all of them commit or none do, so callers can retry the whole batch.
+    """
+    if not records:
+        return
+    log.info(f"Bulk storing {len(records)} chunks")
+    try:
+        written: List[Dict] = []
+        with get_driver().session() as s:
+            with s.begin_transaction() as tx:
+                for rec in records:
+                    params = _chunk_params(rec["chunk"], rec.get("entities", []), rec.get("relations", []))
+                    tx.run(_store_query(), **params)
+                    written.extend(params["relations"])
+                tx.commit()
+        _note_relation_types(written)
+        log.info(f"Bulk stored {len(records)} chunks.")
+    except Exception as e:
+        log.error(f"Bulk store of {len(records)} chunks failed: {e}")
+        raise
+
+
+def compact_relations(batch_size: int = 500) -> Dict:
+    """
+    One-off compaction for graphs written before relations were aggregated
+    (property schema only; typed edges are merged per type and never parallel):
+    folds parallel RELATION edges with the same (source, type, target) into one
+    aggregated edge and converts legacy single edges in place. Runs in batches
+    of source entities via apoc.periodic.iterate, so it is safe on a live graph.
+    """
+    outer = "MATCH (a:Entity) WHERE (a)-[:RELATION]->() RETURN a"
+    inner = """
+    MATCH (a)-[r:RELATION]->(b:Entity)
+    WITH a, b, r.type AS t, collect(r) AS rels
+    WHERE size(rels) > 1 OR head(rels).support IS NULL
+    WITH rels, head(rels) AS keep,
+         reduce(s = 0, x IN rels | s + coalesce(x.support, 1)) AS support,
+         reduce(s = 0.0, x IN rels | s + coalesce(x.conf_sum, coalesce(x.confidence, 1.0))) AS conf_sum,
+         reduce(best = head(rels), x IN rels |
+                CASE WHEN coalesce(x.confidence, 1.0) > coalesce(best.confidence, 1.0) THEN x ELSE best END) AS best,
+         reduce(ids = [], x IN rels |
+                ids + [c IN coalesce(x.chunk_ids, [x.chunk_id]) WHERE c IS NOT NULL AND NOT c IN ids]) AS ids
+    SET keep.support = support,
+        keep.conf_sum = conf_sum,
+        keep.mean_confidence = conf_sum / support,
+        keep.confidence = coalesce(best.confidence, 1.0),
+        keep.evidence = best.evidence,
+        keep.chunk_ids = ids[-$max_ids..]
+    REMOVE keep.chunk_id
+    WITH tail(rels) AS dups
+    FOREACH (d IN dups | DELETE d)
+    """
+    log.info(f"Compacting RELATION edges (batch_size={batch_size})")
+    try:
+        with get_driver().session() as s:
+            res = s.run(
+                "CALL apoc.periodic.iterate($outer, $inner, "
+                "{batchSize:$batch, parallel:false, params:{max_ids:$max_ids}}) "
+                "YIELD batches, total, failedBatches, errorMessages "
+                "RETURN batches, total, failedBatches, errorMessages",
+                outer=outer, inner=inner, batch=batch_size,
+                max_ids=get_config().relation_max_chunk_ids,
+            ).single()
+        stats = dict(res) if res else {}
+        log.info(f"Relation compaction done: {stats}")
+        return stats
+    except Exception as e:
+        log.error(f"Relation compaction failed: {e}")
+        raise
+
+
+# Native relation types seen in the typed schema, so traversals can name them
+# instead of expanding every edge (MENTIONED_IN included) and filtering by label.
+_TYPES_TTL_S = 60.0
+_types_lock = threading.Lock()
+_types_cache: Dict[str, object] = {"types": None, "loaded_at": 0.0}
+
+
+def relation_types(refresh: bool = False) -> List[str]:
+    """
+    Native relationship types used between entities (typed schema). Cached and
+    re-read from the database every minute to pick up other processes' writes.
+    """
+    with _types_lock:
+        stale = time.time() - _types_cache["loaded_at"] > _TYPES_TTL_S
+        if refresh or stale or _types_cache["types"] is None:
+            with get_driver().session() as s:
+                res = s.run(
+                    "CALL db.relationshipTypes() YIELD relationshipType AS t "
+                    "WHERE NOT t IN ['RELATION', 'MENTIONED_IN'] RETURN t"
+                )
+                _types_cache["types"] = {r["t"] for r in res}
+            _types_cache["loaded_at"] = time.time()
+        return sorted(_types_cache["types"])
+
+
+def _note_relation_types(rows: List[Dict]) -> None:
+    """After a typed write: index and cache relationship types seen for the first time."""
+    if not get_config().typed_relations:
+        return
+    known = set(relation_types())
+    new = sorted({r["rtype"] for r in rows if r.get("rtype")} - known)
+    if new:
+        ensure_relation_type_indexes(new)
+        with _types_lock:
+            _types_cache["types"].update(new)
+
+
+def relation_filter() -> str:
+    """
+    APOC relationshipFilter for semantic edges: RELATION, plus every native type
+    in the typed schema (so edges not yet migrated stay visible).
+    """
+    if not get_config().typed_relations:
+        return "RELATION"
+    return "|".join(["RELATION"] + relation_types())
+
+
+def relation_pattern() -> str:
+    """Cypher relationship type filter matching relation_filter(), e.g. `:RELATION|`A`|`B``."""
+    return ":" + "|".join(f"`{t}`" for t in relation_filter().split("|"))
+
+
+def ensure_relation_type_indexes(types: List[str] | None = None) -> int:
+    """
+    Relationship property indexes for typed relations: one range index on
+    `confidence` per relationship type, plus `type` for name lookups.
+    Returns the number of types indexed.
+    """
+    types = relation_types() if types is None else types
+    with get_driver().session() as s:
+        for t in types:
+            for prop in ("confidence", "type"):
+                name = f"rel_{t.lower()}_{prop}_idx"
+                try:
+                    s.run(f"CREATE INDEX {name} IF NOT EXISTS FOR ()-[r:`{t}`]-() ON (r.{prop})")
+                except Exception as e:
+                    log.warning(f"Failed to create relationship index {name}: {e}")
+    log.info(f"Ensured relationship property indexes for {len(types)} relation types")
+    return len(types)
+
+
+def migrate_relation_types(batch_size: int = 500) -> Dict:
+    """
+    Online migration to the typed schema: rewrite every RELATION edge as a native
+    relationship of its (sanitised) type, folding it into an existing typed edge
+    written since TYPED_RELATIONS was switched on. Aggregates add up, less the
+    chunks both edges already counted. Runs in batches via apoc.periodic.iterate;
+    each batch deletes the edges it moved, so the job can be stopped and re-run.
+    """
+    with get_driver().session() as s:
+        names = [r["t"] for r in s.run("MATCH (:Entity)-[r:RELATION]->(:Entity) RETURN DISTINCT r.type AS t")]
+        types = {n: relationship_type(n) for n in names if n}
+        log.info(f"Migrating RELATION edges to {len(set(types.values()))} native types (batch_size={batch_size})")
+        ensure_relation_type_indexes(sorted(set(types.values()) | {relationship_type("")}))
+
+        inner = """
+        WITH r, startNode(r) AS a, endNode(r) AS b, coalesce(r.type, 'RELATED_TO') AS name
+        CALL apoc.merge.relationship(a, coalesce($types[name], $fallback), {},
+             {type:name, support:0, conf_sum:0.0, confidence:0.0, chunk_ids:[]}, b, {}) YIELD rel
+        WITH r, rel, coalesce(r.chunk_ids, []) AS ids, coalesce(rel.chunk_ids, []) AS have
+        WITH r, rel, have, [c IN ids WHERE NOT c IN have] AS new_ids, size([c IN ids WHERE c IN have]) AS overlap
+        WITH r, rel, have, new_ids,
+             coalesce(r.support, 1) - overlap AS add_support,
+             coalesce(r.conf_sum, r.confidence, 1.0)
+               - overlap * coalesce(r.mean_confidence, r.confidence, 1.0) AS add_conf
+        SET rel.evidence = CASE WHEN rel.evidence IS NULL OR coalesce(r.confidence, 1.0) >= rel.confidence
+                                THEN r.evidence ELSE rel.evidence END,
+            rel.confidence = CASE WHEN coalesce(r.confidence, 1.0) > rel.confidence
+                                  THEN coalesce(r.confidence, 1.0) ELSE rel.confidence END,
+            rel.support = rel.support + CASE WHEN add_support > 0 THEN add_support ELSE 0 END,
+            rel.conf_sum = rel.conf_sum + CASE WHEN add_support > 0 THEN add_conf ELSE 0.0 END,
+            rel.chunk_ids = (have + new_ids)[-$max_ids..]
+        SET rel.mean_confidence = CASE WHEN rel.support > 0 THEN rel.conf_sum / rel.support
+                                       ELSE rel.confidence END
+        DELETE r
+        """
+        stats = _iterate(
+            s,
+            "MATCH (:Entity)-[r:RELATION]->(:Entity) RETURN r",
+            inner,
+            {"types": types, "fallback": relationship_type(""),
+             "max_ids": get_config().relation_max_chunk_ids},
+            batch_size,
+        )
+    stats["types"] = len(set(types.values()))
+    relation_types(refresh=True)
+    log.info(f"Relation type migration done: {stats}")
+    if not get_config().typed_relations:
+        log.warning("Migrated to typed relations but TYPED_RELATIONS is off; set it so reads and writes use the new schema.")
+    return stats
+
+
+@dataclass
+class PrunePolicy:
+    """What `prune_graph` removes. Zero / None disables a rule."""
+    min_confidence: float = 0.0       # drop relations whose mean confidence is below this
+    min_support: int = 1              # drop relations seen in fewer chunks than this
+    chunk_ttl_days: float = 0.0       # drop chunks older than this (by created_at)
+    orphans: bool = True              # drop entities with no relations and few mentions
+    orphan_max_mentions: int = 1
+
+    @classmethod
+    def from_config(cls) -> "PrunePolicy":
+        cfg = get_config()
+        return cls(
+            min_confidence=cfg.prune_min_confidence,
+            min_support=cfg.prune_min_support,
+            chunk_ttl_days=cfg.prune_chunk_ttl_days,
+            orphans=cfg.prune_orphans,
+            orphan_max_mentions=cfg.prune_orphan_max_mentions,
+        )
+
+
+# Rough on-disk cost per deleted record (record store + a typical property chain),
+# used only for the dry-run size estimate.
+_NODE_BYTES = 15 + 2 * 41
+_REL_BYTES = 34 + 2 * 41
+
+_EXPIRED_CHUNKS = "MATCH (c:Chunk) WHERE c.created_at < $cutoff"
+
+_WEAK_RELATION = """
+(coalesce(r.support, 1) < $min_support
+ OR coalesce(r.mean_confidence, r.confidence, 1.0) < $min_confidence)
+"""
+
+_ORPHAN_ENTITY = """
+coalesce(e.first_seen, 0) < $started
+AND NOT (e)--(:Entity)
+AND size([(e)-[:MENTIONED_IN]->() | 1]) <= $max_mentions
+"""
+
+# Deleting a chunk also withdraws it from the aggregated relations that cite it:
+# its id leaves chunk_ids and support / conf_sum drop by one observation (at the
+# edge's mean, which keeps mean_confidence unchanged). Edges left with no support
+# are deleted. Support from chunks beyond the bounded chunk_ids list is untouched.
+_DELETE_CHUNK_Q = """
+WITH c WHERE c.created_at < $cutoff
+OPTIONAL MATCH (c)<-[:MENTIONED_IN]-(:Entity)-[r]->(:Entity) WHERE c.id IN r.chunk_ids
+WITH c, collect(DISTINCT r) AS rels
+FOREACH (r IN rels |
+  SET r.chunk_ids = [x IN r.chunk_ids WHERE x <> c.id],
+      r.conf_sum = coalesce(r.conf_sum, 0.0) - coalesce(r.mean_confidence, r.confidence, 0.0),
+      r.support = coalesce(r.support, 1) - 1
+)
+FOREACH (r IN [x IN rels WHERE x.support <= 0] | DELETE r)
+DETACH DELETE c
+"""
+
+
+def _prune_params(policy: PrunePolicy, started: int) -> Dict:
+    ttl_ms = int(policy.chunk_ttl_days * 86_400_000)
+    return {
+        "cutoff": started - ttl_ms if ttl_ms > 0 else -1,
+        "min_support": policy.min_support or 0,
+        "min_confidence": policy.min_confidence or 0.0,
+        "max_mentions": policy.orphan_max_mentions,
+        "started": started,
+    }
+
+
+def prune_report(policy: PrunePolicy | None = None) -> Dict:
+    """
+    Dry run: what `prune_graph` would delete under `policy`, with an estimated
+    size reduction. Each rule is counted against the current graph, so relations
+    emptied by chunk expiry may also be counted as weak, and entities orphaned by
+    this run's deletions are only caught on the next run (orphan count is a lower bound).
+    """
+    policy = policy or PrunePolicy.from_config()
+    params = _prune_params(policy, int(time.time() * 1000))
+    report: Dict = {"policy": policy.__dict__, "dry_run": True}
+    with get_driver().session() as s:
+        totals = s.run(
+            "CALL { MATCH (n) RETURN count(n) AS nodes } "
+            "CALL { MATCH ()-[r]->() RETURN count(r) AS rels } "
+            "RETURN nodes, rels"
+        ).single()
+        report["graph"] = dict(totals)
+
+        chunks = {"chunks": 0, "mentions": 0, "inline_text_bytes": 0, "relations_touched": 0, "relations_emptied": 0}
+        if params["cutoff"] > 0:
+            chunks.update(s.run(
+                _EXPIRED_CHUNKS + " "
+                "RETURN count(c) AS chunks, "
+                "sum(size([(c)<-[:MENTIONED_IN]-() | 1])) AS mentions, "
+                "sum(size(coalesce(c.text, ''))) AS inline_text_bytes",
+                **params,
+            ).single())
+            chunks.update(s.run(
+                _EXPIRED_CHUNKS + " "
+                "MATCH (c)<-[:MENTIONED_IN]-(:Entity)-[r]->(:Entity) WHERE c.id IN r.chunk_ids "
+                "WITH r, count(DISTINCT c) AS hits "
+                "RETURN count(r) AS relations_touched, "
+                "sum(CASE WHEN coalesce(r.support, 1) - hits <= 0 THEN 1 ELSE 0 END) AS relations_emptied",
+                **params,
+            ).single())
+        report["expired_chunks"] = chunks
+
+        weak = 0
+        if params["min_support"] > 1 or params["min_confidence"] > 0:
+            weak = s.run(
+                f"MATCH (:Entity)-[r]->(:Entity) WHERE {_WEAK_RELATION} RETURN count(r) AS n", **params
+            ).single()["n"]
+        report["weak_relations"] = weak
+
+        orphans = {"entities": 0, "mentions": 0}
+        if policy.orphans:
+            orphans = dict(s.run(
+                f"MATCH (e:Entity) WHERE {_ORPHAN_ENTITY} "
+                "RETURN count(e) AS entities, sum(size([(e)-[:MENTIONED_IN]->() | 1])) AS mentions",
+                **params,
+            ).single())
+        report["orphan_entities"] = orphans
+
+    nodes = chunks["chunks"] + orphans["entities"]
+    rels = chunks["mentions"] + chunks["relations_emptied"] + weak + orphans["mentions"]
+    report["estimate"] = {
+        "nodes": nodes,
+        "relationships": rels,
+        "bytes": nodes * _NODE_BYTES + rels * _REL_BYTES + chunks["inline_text_bytes"],
+        "node_fraction": round(nodes / totals["nodes"], 4) if totals["nodes"] else 0.0,
+        "relationship_fraction": round(rels / totals["rels"], 4) if totals["rels"] else 0.0,
+    }
+    log.info(f"Prune dry run: {report['estimate']}")
+    return report
+
+
+def _iterate(s, outer: str, inner: str, params: Dict, batch_size: int) -> Dict:
+    res = s.run(
+        "CALL apoc.periodic.iterate($outer, $inner, "
+        "{batchSize:$batch, parallel:false, params:$params}) "
+        "YIELD batches, total, failedBatches, errorMessages "
+        "RETURN batches, total, failedBatches, errorMessages",
+        outer=outer, inner=inner, batch=batch_size, params=params,
+    ).single()
+    return dict(res) if res else {}
+
+
+def prune_graph(policy: PrunePolicy | None = None, batch_size: int = 500, dry_run: bool = False) -> Dict:
+    """
+    Delete expired chunks, weak relations and orphan entities under `policy`, in
+    that order (so entities orphaned by the first two steps go in the same run).
+    Each step runs in batches via apoc.periodic.iterate and re-checks its condition
+    inside the batch transaction, so it is safe on a live graph: anything written
+    after the run started (by created_at / first_seen) is never considered.
+    """
+    policy = policy or PrunePolicy.from_config()
+    if dry_run:
+        return prune_report(policy)
+
+    params = _prune_params(policy, int(time.time() * 1000))
+    stats: Dict = {"policy": policy.__dict__, "dry_run": False}
+    log.info(f"Pruning graph with {policy} (batch_size={batch_size})")
+    try:
+        with get_driver().session() as s:
+            if params["cutoff"] > 0:
+                stats["expired_chunks"] = _iterate(
+                    s, _EXPIRED_CHUNKS + " RETURN c", _DELETE_CHUNK_Q, params, batch_size
+                )
+            if params["min_support"] > 1 or params["min_confidence"] > 0:
+                stats["weak_relations"] = _iterate(
+                    s,
+                    f"MATCH (:Entity)-[r]->(:Entity) WHERE {_WEAK_RELATION} RETURN r",
+                    f"WITH r WHERE {_WEAK_RELATION} DELETE r",
+                    params, batch_size,
+                )
+            if policy.orphans:
+                stats["orphan_entities"] = _iterate(
+                    s,
+                    f"MATCH (e:Entity) WHERE {_ORPHAN_ENTITY} RETURN e",
+                    f"WITH e WHERE {_ORPHAN_ENTITY} DETACH DELETE e",
+                    params, batch_size,
+                )
+        log.info(f"Prune done: {stats}")
+        return stats
     except Exception as e:
-        log.error(f"Failed to store chunk {chunk.id}: {e}")
+        log.error(f"Prune failed: {e}")
         raise
 
 
@@ -123,11 +623,11 @@ def search_entities_contains(q: str, limit: int | None = None) -> List[Dict]:
     Search for entities whose names partially match a given string.
     This is user-facing, so it uses retrieval_search_limit from config.
     """
-    limit = limit or _cfg.retrieval_search_limit
+    limit = limit or get_config().retrieval_search_limit
     log.info(f"Searching entities containing '{q}' (limit={limit})")
 
     try:
-        with _driver.session() as s:
+        with get_driver().session() as s:
             res = s.run(
                 "MATCH (e:Entity) "
                 "WHERE toLower(e.name) CONTAINS toLower($q) "
@@ -143,29 +643,100 @@ def search_entities_contains(q: str, limit: int | None = None) -> List[Dict]:
         return []
 
 
-def k_hop_chunks(entity_name: str, k: int = 1, limit: int | None = None) -> List[Dict]:
+def attach_chunk_texts(rows: List[Dict]) -> List[Dict]:
+    """Fill `text` on chunk rows from the external store with one bulk read."""
+    keys = [r["text_id"] for r in rows if not r.get("text") and r.get("text_id")]
+    texts = fetch_texts(keys)
+    for r in rows:
+        if not r.get("text") and r.get("text_id"):
+            r["text"] = texts.get(r["text_id"])
+    return rows
+
+
+def externalize_chunk_texts(batch_size: int = 500) -> int:
     """
-    Returns chunk evidence k hops away from an entity.
-    Uses APOC for subgraph expansion.
+    Move text still stored inline on Chunk nodes into the external store,
+    leaving text_id + preview. Runs in batches; returns chunks moved.
+    """
+    preview_chars = get_config().chunk_preview_chars
+    store = get_blob_store()
+    moved = 0
+    with get_driver().session() as s:
+        while True:
+            rows = s.run(
+                "MATCH (c:Chunk) WHERE c.text IS NOT NULL RETURN c.id AS id, c.text AS text LIMIT $n",
+                n=batch_size,
+            ).data()
+            if not rows:
+                break
+            updates = [
+                {"id": r["id"], "text_id": store.put(r["text"]), "preview": r["text"][:preview_chars]}
+                for r in rows
+            ]
+            s.run(
+                "UNWIND $rows AS r MATCH (c:Chunk {id:r.id}) "
+                "SET c.text_id=r.text_id, c.preview=r.preview REMOVE c.text",
+                rows=updates,
+            )
+            moved += len(updates)
+            log.info(f"Externalized {moved} chunk texts so far")
+    log.info(f"Externalized {moved} chunk texts: {store.stats()}")
+    return moved
+
+
+def _neighbour_hops(s, entity_name: str, k: int, fanout: int) -> List[Dict]:
+    """
+    Entities within k relation hops (either direction), expanded hop by hop with
+    an indexed lookup per hop. Each hop keeps the `fanout` best-supported neighbours
+    so hubs cannot blow up the frontier.
+    """
+    hops = [{"name": entity_name, "hop": 0}]
+    seen = {entity_name}
+    frontier = [entity_name]
+    for hop in range(1, k + 1):
+        if not frontier:
+            break
+        res = s.run(
+            "UNWIND $frontier AS name "
+            f"MATCH (:Entity {{name:name}})-[r{relation_pattern()}]-(n:Entity) "
+            "WHERE NOT n.name IN $seen "
+            "WITH n.name AS nb, sum(coalesce(r.support, 1)) AS w "
+            "RETURN nb ORDER BY w DESC LIMIT $fanout",
+            frontier=frontier, seen=list(seen), fanout=fanout,
+        )
+        frontier = [r["nb"] for r in res]
+        seen.update(frontier)
+        hops.extend({"name": n, "hop": hop} for n in frontier)
+    return hops
+
+
+def k_hop_chunks(entity_name: str, k: int = 1, limit: int | None = None, fanout: int = 50) -> List[Dict]:
+    """
+    Returns chunk evidence for an entity and its neighbours up to k hops away.
+    Answered from the entity→chunk posting lists (MENTIONED_IN edges carrying
+    mention counts and positions): each entity's postings are weighted by
+    mentions / (1 + hop) and merged into one ranked list.
+    Rows carry only the chunk's preview; attach_chunk_texts() fills in the ones
+    that end up in the context (see retrieval.pack_chunk_evidence). `text` is set only for chunks stored inline.
     This is an internal traversal — uses neo4j_query_limit from config.
     """
-    limit = limit or _cfg.neo4j_query_limit
-    log.info(f"Fetching {k}-hop neighborhood for '{entity_name}' (limit={limit})")
+    limit = limit or get_config().neo4j_query_limit
+    log.info(f"Fetching {k}-hop chunk postings for '{entity_name}' (limit={limit})")
 
     q = """
-    MATCH (e:Entity {name:$name})
-    CALL apoc.path.subgraphNodes(e, {relationshipFilter:'RELATION>', maxLevel:$k})
-    YIELD node
-    WITH DISTINCT node WHERE node:Chunk
-    RETURN node.id as cid, node.text as text
+    UNWIND $ents AS x
+    MATCH (:Entity {name:x.name})-[m:MENTIONED_IN]->(c:Chunk)
+    WITH c, sum(coalesce(m.mentions, 1) / (1.0 + x.hop)) AS score, collect(x.name) AS via
+    RETURN c.id as cid, c.text_id as text_id, c.preview as preview, c.text as text, score, via
+    ORDER BY score DESC
     LIMIT $limit
     """
 
     try:
-        with _driver.session() as s:
-            res = s.run(q, name=entity_name, k=k, limit=limit)
-            data = res.data()
-            log.info(f"Retrieved {len(data)} chunks for '{entity_name}' (k={k})")
+        with get_driver().session() as s:
+            ents = _neighbour_hops(s, entity_name, k, fanout)
+            data = s.run(q, ents=ents, limit=limit).data()
+            log.info(f"Retrieved {len(data)} chunks for '{entity_name}' (k={k}, {len(ents)} entities)")
             return data
     except Exception as e:
         log.error(f"Failed k-hop retrieval for '{entity_name}': {e}")
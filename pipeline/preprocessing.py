@@ -1,31 +1,71 @@
 from __future__ import annotations
 import re
+from functools import lru_cache
 from typing import List
 
-try:
-    import tiktoken
-    ENCODER = tiktoken.get_encoding("cl100k_base")
-except Exception:
-    ENCODER = None
+from pipeline.resources import get_encoder, get_nlp
 
 def clean_basic(text: str) -> str:
     t = text.replace("\r\n", " ").replace("\n", " ")
     t = re.sub(r"\s+", " ", t).strip()
     return t
 
+def split_documents(text: str) -> List[str]:
+    """Split pasted input into separate short documents on blank lines."""
+    return [d.strip() for d in re.split(r"\n\s*\n", text) if d.strip()]
+
+
+_SENT_RE = re.compile(r"(?<=[.!?])(?<!Mr\.)(?<!Ms\.)(?<!Dr\.)(?<!St\.)(?<!Mrs\.)(?<!Jr\.)(?<!vs\.)\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def split_sentences(text: str, doc=None) -> List[str]:
+    """Sentences via spaCy (reusing `doc` if given), else a punctuation regex."""
+    if doc is None:
+        nlp = get_nlp()
+        doc = nlp(text) if nlp else None
+    if doc is not None:
+        try:
+            return [s.text.strip() for s in doc.sents if s.text.strip()]
+        except ValueError:
+            pass  # pipeline without parser/senter: no sentence boundaries
+    return [s.strip() for s in _SENT_RE.split(text) if s.strip()]
+
+
 def chunk_tokens(text: str, max_tokens: int = 600, overlap: int = 100) -> List[str]:
     if not text:
         return []
-    if ENCODER:
-        toks = ENCODER.encode(text)
+    encoder = get_encoder()
+    if encoder:
+        toks = encoder.encode(text)
         chunks = []
         start = 0
         while start < len(toks):
             end = min(start + max_tokens, len(toks))
-            chunks.append(ENCODER.decode(toks[start:end]))
+            chunks.append(encoder.decode(toks[start:end]))
             start += max_tokens - overlap
         return chunks
     # char fallback (~4000 chars ~ 600 tokens)
     size = 4000
     step = size - int(overlap * 6)
-    return [text[i:i+size] for i in range(0, len(text), step)]
\ No newline at end of file
+    return [text[i:i+size] for i in range(0, len(text), step)]
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str) -> int:
+    """Token count under the shared encoder (≈ chars/4 without tiktoken). Cached per string."""
+    if not text:
+        return 0
+    encoder = get_encoder()
+    if encoder:
+        return len(encoder.encode(text))
+    return max(1, (len(text) + 3) // 4)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most `max_tokens` tokens, marking the cut with an ellipsis."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoder = get_encoder()
+    if encoder:
+        return encoder.decode(encoder.encode(text)[:max_tokens]).rstrip() + "…"
+    return text[: max_tokens * 4].rsplit(" ", 1)[0] + "…"
@@ -0,0 +1,191 @@
+"""
+Evidence ranking and token-budgeted context packing for retrieval.
+
+Candidate relations from the contextual subgraphs are scored on confidence,
+hop distance from the matched entity, endpoint degree and community match,
+then greedily packed into an exact token budget with a redundancy penalty.
+"""
+from __future__ import annotations
+import logging
+import math
+import re
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from pipeline.preprocessing import count_tokens, truncate_tokens
+
+log = logging.getLogger("retrieval")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class RankWeights:
+    confidence: float = 0.40
+    hop: float = 0.25
+    degree: float = 0.15
+    community: float = 0.20
+    # multiplied by the max word-overlap with already selected evidence
+    redundancy: float = 0.60
+    # candidates at least this similar to something selected are dropped outright
+    redundancy_cutoff: float = 0.85
+
+
+@dataclass
+class Candidate:
+    src: str
+    rel: str
+    tgt: str
+    evidence: str = ""
+    confidence: float = 1.0
+    hop: int = 1
+    seed: str = ""
+    score: float = 0.0
+    text: str = ""
+    tokens: int = 0
+    words: Set[str] = field(default_factory=set)
+
+    @property
+    def key(self) -> tuple:
+        return (self.src, self.rel, self.tgt)
+
+
+def _hops_from(seed: str, rels: List[Dict]) -> Dict[str, int]:
+    """Undirected BFS distances from the seed entity over the returned relations."""
+    adj: Dict[str, Set[str]] = defaultdict(set)
+    for r in rels:
+        adj[r["src"]].add(r["tgt"])
+        adj[r["tgt"]].add(r["src"])
+    dist = {seed: 0}
+    queue = deque([seed])
+    while queue:
+        node = queue.popleft()
+        for nb in adj[node]:
+            if nb not in dist:
+                dist[nb] = dist[node] + 1
+                queue.append(nb)
+    return dist
+
+
+def collect_candidates(subgraphs: Dict[str, Dict]) -> tuple[List[Candidate], Dict[str, int], Dict[str, Optional[int]]]:
+    """
+    Flatten {seed_entity: subgraph} into unique candidates (keeping the closest hop),
+    plus the degree and community of every entity seen.
+    """
+    by_key: Dict[tuple, Candidate] = {}
+    degree: Dict[str, int] = defaultdict(int)
+    community: Dict[str, Optional[int]] = {}
+
+    for seed, sg in subgraphs.items():
+        for ent in sg.get("entities", []) or []:
+            community.setdefault(ent.get("name"), ent.get("community"))
+        rels = [r for r in sg.get("rels", []) or [] if r.get("src") and r.get("tgt")]
+        dist = _hops_from(seed, rels)
+        for r in rels:
+            hop = min(dist.get(r["src"], 99), dist.get(r["tgt"], 99)) + 1
+            cand = Candidate(
+                src=r["src"],
+                rel=r.get("rel") or "RELATED_TO",
+                tgt=r["tgt"],
+                evidence=r.get("evidence") or "",
+                confidence=float(r.get("confidence") if r.get("confidence") is not None else 1.0),
+                hop=hop,
+                seed=seed,
+            )
+            prev = by_key.get(cand.key)
+            if prev is None:
+                by_key[cand.key] = cand
+                degree[cand.src] += 1
+                degree[cand.tgt] += 1
+            elif cand.hop < prev.hop or (cand.hop == prev.hop and cand.confidence > prev.confidence):
+                by_key[cand.key] = cand
+
+    return list(by_key.values()), dict(degree), community
+
+
+def score_candidates(candidates: List[Candidate],
+                     degree: Dict[str, int],
+                     community: Dict[str, Optional[int]],
+                     seeds: Iterable[str],
+                     weights: RankWeights = RankWeights()) -> None:
+    """Assign `score` in [0, 1] to each candidate in place."""
+    seed_comms = {community.get(s) for s in seeds} - {None}
+    max_deg = max(degree.values(), default=1)
+    log_max = math.log1p(max_deg) or 1.0
+
+    for c in candidates:
+        conf = min(max(c.confidence, 0.0), 1.0)
+        hop = 1.0 / c.hop
+        deg = math.log1p(degree.get(c.src, 0) + degree.get(c.tgt, 0)) / (2 * log_max) if max_deg else 0.0
+        comm = 1.0 if seed_comms and (community.get(c.src) in seed_comms or community.get(c.tgt) in seed_comms) else 0.0
+        c.score = (
+            weights.confidence * conf
+            + weights.hop * hop
+            + weights.degree * min(deg, 1.0)
+            + weights.community * comm
+        )
+
+
+def format_candidate(c: Candidate, evidence_max_tokens: int) -> str:
+    line = f"({c.src}) -[{c.rel}]-> ({c.tgt}) [Conf:{c.confidence:g}]"
+    if c.evidence:
+        line += f" : {truncate_tokens(c.evidence, evidence_max_tokens)}"
+    return line
+
+
+def _overlap(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def pack_context(candidates: List[Candidate],
+                 token_budget: int,
+                 evidence_max_tokens: int = 80,
+                 per_entity: int | None = None,
+                 weights: RankWeights = RankWeights()) -> List[Candidate]:
+    """
+    Greedy packing: walk candidates best-first, discount each by its overlap with what
+    is already selected, and take it if it still clears the cutoff and fits the budget.
+    The budget is checked against the exact token count of the joined context.
+    """
+    for c in candidates:
+        c.text = format_candidate(c, evidence_max_tokens)
+        c.tokens = count_tokens(c.text + "\n")
+        c.words = set(_WORD_RE.findall(f"{c.src} {c.rel} {c.tgt} {c.evidence}".lower()))
+
+    remaining = sorted(candidates, key=lambda c: c.score, reverse=True)
+    selected: List[Candidate] = []
+    per_seed: Dict[str, int] = defaultdict(int)
+    used = 0
+
+    while remaining:
+        best_i, best_adj = -1, -1.0
+        for i, c in enumerate(remaining):
+            if c.score <= best_adj:
+                break  # sorted by base score; nothing later can beat best_adj
+            if used + c.tokens > token_budget:
+                continue
+            if per_entity and per_seed[c.seed] >= per_entity:
+                continue
+            red = max((_overlap(c.words, s.words) for s in selected), default=0.0)
+            if red >= weights.redundancy_cutoff:
+                continue
+            adj = c.score * (1.0 - weights.redundancy * red)
+            if adj > best_adj:
+                best_i, best_adj = i, adj
+        if best_i < 0:
+            break
+        c = remaining.pop(best_i)
+        selected.append(c)
+        per_seed[c.seed] += 1
+        used += c.tokens
+
+    used = count_tokens("\n".join(c.text for c in selected))
+    while selected and used > token_budget:
+        selected.pop()
+        used = count_tokens("\n".join(c.text for c in selected))
+
+    log.info(f"Packed {len(selected)}/{len(candidates)} relations into {used}/{token_budget} tokens.")
+    return selected
@@ -1,11 +1,12 @@
 from __future__ import annotations
 import logging
-from typing import List, Dict
-from config.config import load_config
+import re
+from typing import List, Dict, Optional, Tuple
+from pipeline.resources import get_config
 from pipeline.utils import read_text
 from pipeline.llm_client_local import generate_json
+from pipeline.preprocessing import split_sentences
 
-_cfg = load_config()
 log = logging.getLogger("relation_extractor")
 
 
@@ -29,23 +30,69 @@ def normalize_relation_name(name: str) -> str:
     return name.upper()
 
 
-def extract_relations(chunk_text: str) -> List[Dict]:
+_RESERVED_TYPES = {"RELATION", "MENTIONED_IN"}
+
+
+def relationship_type(name: str) -> str:
     """
-    Extract relationships between entities using the local LLM.
-    Expected model output: JSON list of {source, target, relation, evidence, confidence}.
+    Native Neo4j relationship type for a relation name (typed schema): the
+    normalized name reduced to [A-Z0-9_], at most 64 chars, never starting with
+    a digit or clashing with the graph's structural types.
     """
-    tpl_path = _cfg.prompts_dir / "extract_relations.txt"
-    tpl = read_text(tpl_path)
+    t = re.sub(r"[^A-Z0-9_]+", "_", normalize_relation_name(name).upper())
+    t = re.sub(r"_+", "_", t).strip("_")[:64] or "RELATED_TO"
+    if t[0].isdigit() or t in _RESERVED_TYPES:
+        t = f"REL_{t}"
+    return t
 
-    prompt = tpl.replace("{input_text}", chunk_text)
 
-    try:
-        log.info("Running relation extraction LLM...")
-        data = generate_json(prompt, max_tokens=512)
-    except Exception as e:
-        log.error(f"Relation extraction failed: {e}")
-        return []
+def _mentions(sentence: str, names: List[str]) -> List[str]:
+    low = sentence.lower()
+    return [n for n in names if re.search(rf"(?<!\w){re.escape(n.lower())}(?!\w)", low)]
 
+
+def candidate_pairs(chunk_text: str,
+                    entity_names: List[str],
+                    known_pairs: Optional[set] = None,
+                    window: Optional[int] = None,
+                    max_pairs: Optional[int] = None,
+                    doc=None) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Entity pairs that co-occur within `window` consecutive sentences, most
+    frequent first, minus pairs already related (in either direction) in
+    `known_pairs`. Returns (pairs, sentences covering them).
+    """
+    cfg = get_config()
+    window = window or cfg.relation_pair_window
+    max_pairs = max_pairs or cfg.relation_max_pairs
+    known = {frozenset(str(x).lower() for x in p) for p in (known_pairs or set())}
+
+    sentences = split_sentences(chunk_text, doc=doc)
+    found = [_mentions(s, entity_names) for s in sentences]
+    counts: Dict[frozenset, int] = {}
+    order: Dict[frozenset, Tuple[str, str]] = {}
+    spans: Dict[frozenset, int] = {}
+    for start in range(len(sentences)):
+        names = []
+        for f in found[start:start + window]:
+            names.extend(n for n in f if n not in names)
+        for a_i, a in enumerate(names):
+            for b in names[a_i + 1:]:
+                key = frozenset((a, b))
+                if len(key) < 2 or frozenset((a.lower(), b.lower())) in known:
+                    continue
+                counts[key] = counts.get(key, 0) + 1
+                order.setdefault(key, (a, b))
+                spans.setdefault(key, start)
+
+    ranked = sorted(counts, key=lambda k: -counts[k])[:max_pairs]
+    keep = set()
+    for key in ranked:
+        keep.update(range(spans[key], min(spans[key] + window, len(sentences))))
+    return [order[k] for k in ranked], [sentences[i] for i in sorted(keep)]
+
+
+def _normalize_output(data) -> List[Dict]:
     # Handle possible return types (dict, list, str)
     if isinstance(data, dict) and "raw" in data:
         log.warning("Received dict with raw key (legacy mode), skipping parse")
@@ -53,13 +100,82 @@ def extract_relations(chunk_text: str) -> List[Dict]:
     elif isinstance(data, list):
         # Normalize relation types for Neo4j
         for rel in data:
-            if "relation" in rel:
+            if isinstance(rel, dict) and "relation" in rel:
                 rel["relation"] = normalize_relation_name(rel["relation"])
-        log.info(f"Extracted and normalized {len(data)} relations.")
-        return data
+        return [rel for rel in data if isinstance(rel, dict)]
     elif isinstance(data, str):
         log.warning("Got string output from model, not JSON")
         return []
     else:
         log.warning(f"Unexpected relation extraction output type: {type(data)}")
         return []
+
+
+def _label_pairs(chunk_text: str, entities: List[Dict] | List[str], known_relations: List[Dict], doc) -> List[Dict]:
+    """Ask the model to label only co-occurring entity pairs; skip the call when there are none."""
+    names = [e.get("name", "") if isinstance(e, dict) else str(e) for e in entities]
+    names = sorted({n.strip() for n in names if n and n.strip()}, key=len, reverse=True)
+    known = {(r.get("source"), r.get("target")) for r in known_relations or [] if isinstance(r, dict)}
+    pairs, sentences = candidate_pairs(chunk_text, names, known_pairs=known, doc=doc)
+    if not pairs:
+        log.info(f"No candidate entity pairs among {len(names)} entities; skipping relation refinement.")
+        return []
+
+    tpl = read_text(get_config().prompts_dir / "extract_relations_pairs.txt")
+    prompt = (tpl.replace("{pairs}", "\n".join(f"{i}. {a} | {b}" for i, (a, b) in enumerate(pairs)))
+                 .replace("{input_text}", " ".join(sentences)))
+    try:
+        log.info(f"Running relation labelling LLM on {len(pairs)} entity pairs ({len(sentences)} sentences)...")
+        data = generate_json(prompt, max_tokens=min(512, 64 + 56 * len(pairs)))
+    except Exception as e:
+        log.error(f"Relation extraction failed: {e}")
+        return []
+
+    relations = []
+    for rel in _normalize_output(data):
+        try:
+            a, b = pairs[int(rel.get("pair"))]
+        except (TypeError, ValueError, IndexError):
+            continue
+        source = a if str(rel.get("source", a)).strip().lower() != b.lower() else b
+        relations.append({
+            "source": source,
+            "target": b if source == a else a,
+            "relation": rel.get("relation") or "RELATED_TO",
+            "evidence": rel.get("evidence", ""),
+            "confidence": rel.get("confidence", 0.5),
+        })
+    log.info(f"Labelled {len(relations)} of {len(pairs)} candidate pairs.")
+    return relations
+
+
+def extract_relations(chunk_text: str,
+                      entities: Optional[List[Dict] | List[str]] = None,
+                      known_relations: Optional[List[Dict]] = None,
+                      doc=None) -> List[Dict]:
+    """
+    Extract relationships between entities using the local LLM.
+    Expected model output: JSON list of {source, target, relation, evidence, confidence}.
+    With `entities` from a first extraction pass, only entity pairs co-occurring
+    within a few sentences (and not already in `known_relations`) are sent to
+    the model for labelling; when there are none, no LLM call is made.
+    """
+    if entities is not None:
+        return _label_pairs(chunk_text, entities, known_relations or [], doc)
+
+    tpl_path = get_config().prompts_dir / "extract_relations.txt"
+    tpl = read_text(tpl_path)
+
+    prompt = tpl.replace("{input_text}", chunk_text)
+
+    try:
+        log.info("Running relation extraction LLM...")
+        data = generate_json(prompt, max_tokens=512)
+    except Exception as e:
+        log.error(f"Relation extraction failed: {e}")
+        return []
+
+    relations = _normalize_output(data)
+    if isinstance(data, list):
+        log.info(f"Extracted and normalized {len(relations)} relations.")
+    return relations
@@ -0,0 +1,198 @@
+"""
+Process-wide shared resources: config, Neo4j driver, spaCy model, tokenizer and
+the local Llama model.
+
+Nothing heavy happens at import time. Each resource is built on first use under
+its own lock and then reused by every module (and every Streamlit rerun, which
+re-executes app.py but keeps imported modules alive). `warm_up()` lets callers
+pay the loading cost up front instead of on the first request.
+"""
+from __future__ import annotations
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from config.config import AppConfig, load_config
+
+log = logging.getLogger("resources")
+
+_MISSING = object()
+_instances: Dict[str, Any] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _registry_lock:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def shared(key: str, factory: Callable[[], Any]) -> Any:
+    """
+    Return the process-wide instance stored under `key`, building it with
+    `factory` on first use. Double-checked so the hot path takes no lock;
+    a per-key lock keeps a slow factory (e.g. the LLM) from blocking others.
+    A factory may return None (optional dependency missing) — that is cached too.
+    """
+    inst = _instances.get(key, _MISSING)
+    if inst is not _MISSING:
+        return inst
+    with _lock_for(key):
+        inst = _instances.get(key, _MISSING)
+        if inst is _MISSING:
+            start = time.time()
+            inst = factory()
+            _instances[key] = inst
+            log.info(f"Initialized shared resource '{key}' in {time.time() - start:.3f}s")
+    return inst
+
+
+def reset(key: str | None = None) -> None:
+    """Drop one (or all) cached resources so the next access rebuilds them."""
+    keys = [key] if key else list(_instances)
+    for k in keys:
+        with _lock_for(k):
+            inst = _instances.pop(k, None)
+            close = getattr(inst, "close", None) if k == "driver" else None
+            if close:
+                try:
+                    close()
+                except Exception as e:
+                    log.warning(f"Failed to close resource '{k}': {e}")
+
+
+# -------------------------------------------------------------------
+# Factories
+# -------------------------------------------------------------------
+def _build_driver():
+    from neo4j import GraphDatabase
+
+    cfg = get_config().neo4j
+    log.info(
+        f"Opening Neo4j driver to {cfg.uri} "
+        f"(pool={cfg.max_connection_pool_size}, acquire_timeout={cfg.connection_acquisition_timeout}s)"
+    )
+    return GraphDatabase.driver(
+        cfg.uri,
+        auth=(cfg.user, cfg.password),
+        max_connection_pool_size=cfg.max_connection_pool_size,
+        connection_acquisition_timeout=cfg.connection_acquisition_timeout,
+        max_connection_lifetime=cfg.max_connection_lifetime,
+        connection_timeout=cfg.connection_timeout,
+    )
+
+
+def _build_nlp():
+    name = get_config().spacy_model
+    try:
+        import spacy
+        return spacy.load(name)
+    except Exception as e:
+        log.warning(f"spaCy model '{name}' unavailable, candidate seeding disabled: {e}")
+        return None
+
+
+def _build_encoder():
+    name = get_config().tokenizer_encoding
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        log.warning(f"tiktoken encoding '{name}' unavailable, using char fallback: {e}")
+        return None
+
+
+def _build_llm():
+    from pathlib import Path
+    from llama_cpp import Llama
+
+    llm_cfg = get_config().local_llm
+    model_path = Path(llm_cfg.model_dir) / llm_cfg.model_file
+    log.info(f"Loading local LLM model from: {model_path}")
+
+    if not model_path.exists():
+        log.error(f"Local GGUF model not found: {model_path}")
+        raise FileNotFoundError(f"Local GGUF not found: {model_path}")
+
+    start = time.time()
+    try:
+        model = Llama(
+            model_path=str(model_path),
+            n_ctx=llm_cfg.n_ctx,
+            n_gpu_layers=llm_cfg.n_gpu_layers,
+            verbose=llm_cfg.verbose,
+            # speculative decoding verifies drafts against per-position logits
+            logits_all=llm_cfg.speculative,
+        )
+    except Exception as e:
+        log.error(f"Failed to load model: {e}")
+        raise
+    log.info(
+        f"Loaded model '{model_path.name}' "
+        f"(ctx={llm_cfg.n_ctx}, gpu_layers={llm_cfg.n_gpu_layers}) "
+        f"in {time.time() - start:.2f}s"
+    )
+    return model
+
+
+# -------------------------------------------------------------------
+# Accessors
+# -------------------------------------------------------------------
+def get_config() -> AppConfig:
+    return shared("config", load_config)
+
+
+def get_driver():
+    """Single pooled Neo4j driver; sessions are cheap, drivers are not."""
+    return shared("driver", _build_driver)
+
+
+def get_nlp():
+    """spaCy pipeline, or None if spaCy / the model is not installed."""
+    return shared("nlp", _build_nlp)
+
+
+def get_encoder():
+    """tiktoken encoder, or None if tiktoken is not installed."""
+    return shared("encoder", _build_encoder)
+
+
+def get_llm():
+    """Local llama.cpp model. Raises if the GGUF file is missing."""
+    return shared("llm", _build_llm)
+
+
+_ACCESSORS: Dict[str, Callable[[], Any]] = {
+    "config": get_config,
+    "driver": get_driver,
+    "nlp": get_nlp,
+    "encoder": get_encoder,
+    "llm": get_llm,
+}
+
+
+def warm_up(components: Iterable[str] = ("config", "driver", "nlp", "encoder")) -> Dict[str, float]:
+    """
+    Eagerly build the given resources and return {name: seconds}.
+    The LLM is left out by default because loading it can take tens of seconds;
+    pass it explicitly when extraction is about to run.
+    Failures are logged, not raised, so a missing optional model does not block startup.
+    """
+    timings: Dict[str, float] = {}
+    for name in components:
+        start = time.time()
+        try:
+            _ACCESSORS[name]()
+        except Exception as e:
+            log.error(f"Warm-up of '{name}' failed: {e}")
+        timings[name] = time.time() - start
+    log.info("Warm-up complete: " + ", ".join(f"{k}={v:.3f}s" for k, v in timings.items()))
+    return timings
+
+
+atexit.register(reset, "driver")
@@ -1,27 +1,58 @@
 from __future__ import annotations
-from typing import List, Dict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, List, Dict
 import logging
 import time
 
-from pipeline.neo4j_client import _driver
-from pipeline.utils import truncate
-from config.config import load_config
+from pipeline.neo4j_client import attach_chunk_texts, k_hop_chunks, relation_filter, search_entities_contains
+from pipeline.preprocessing import count_tokens, truncate_tokens
+from pipeline.relation_extractor import normalize_relation_name, relationship_type
+from pipeline.ranking import Candidate, collect_candidates, pack_context, score_candidates
+from pipeline.resources import get_config, get_driver
+from pipeline.utils import dedup_keep_order
 
 log = logging.getLogger("retrieval")
-_cfg = load_config()
 
 
-def get_contextual_subgraph(entity_name: str, k: int = 1, limit: int | None = None) -> Dict:
-    limit = limit or _cfg.neo4j_query_limit
+def _relation_names(rel_types: List[str]) -> List[str]:
+    """
+    Names a RELATION edge's `type` property may hold for `rel_types`: it stores the
+    extractor's label as given, so match the raw and upper-cased forms as well as
+    the normalize_relation_name form.
+    """
+    names = []
+    for t in rel_types:
+        names += [t, t.upper(), normalize_relation_name(t)]
+    return dedup_keep_order(names)
+
+
+def get_contextual_subgraph(entity_name: str,
+                            k: int = 1,
+                            limit: int | None = None,
+                            rel_types: List[str] | None = None) -> Dict:
+    """
+    Entities and relations within k hops of an entity. Expansion stays on Entity
+    nodes and, with `rel_types`, on those relation kinds only: in the typed schema
+    APOC prunes by native type; RELATION edges are filtered on their `type` property.
+    """
+    limit = limit or get_config().neo4j_query_limit
+    native = [relationship_type(t) for t in rel_types or []]
+    if get_config().typed_relations and native:
+        rel_filter = "|".join(native + ["RELATION"])
+    else:
+        rel_filter = relation_filter()
     q = """
     MATCH (e:Entity {name:$name})
-    CALL apoc.path.subgraphAll(e, {maxLevel:$k}) YIELD nodes, relationships
-    WITH nodes, relationships
+    CALL apoc.path.subgraphAll(e, {maxLevel:$k, labelFilter:'+Entity', relationshipFilter:$rel_filter})
+    YIELD nodes, relationships
+    WITH nodes, [r IN relationships WHERE $types IS NULL
+                 OR type(r) IN $native OR r.type IN $types] AS relationships
     RETURN
         [n IN nodes WHERE n:Entity | {name:n.name, community:n.community}] AS entities,
         [r IN relationships | {
             src:startNode(r).name,
-            rel:type(r),
+            rel:coalesce(r.type, type(r)),
             tgt:endNode(r).name,
             evidence:r.evidence,
             confidence:r.confidence
@@ -31,8 +62,11 @@ def get_contextual_subgraph(entity_name: str, k: int = 1, limit: int | None = No
     log.info(f"Fetching contextual subgraph for entity='{entity_name}', k={k}, limit={limit}")
     start = time.time()
     try:
-        with _driver.session() as s:
-            res = s.run(q, name=entity_name, k=k, limit=limit).data()
+        with get_driver().session() as s:
+            res = s.run(
+                q, name=entity_name, k=k, limit=limit, rel_filter=rel_filter,
+                types=_relation_names(rel_types) if rel_types else None, native=native,
+            ).data()
         duration = time.time() - start
         log.info(f"Subgraph query completed in {duration:.3f}s — found {len(res)} records.")
         if res:
@@ -45,47 +79,119 @@ def get_contextual_subgraph(entity_name: str, k: int = 1, limit: int | None = No
         return {"entities": [], "rels": []}
 
 
-def gather_evidence(query: str, k_hop: int = 1, per_entity: int | None = None) -> tuple[list[str], str]:
-    per_entity = per_entity or 3
+def retrieve_subgraphs(terms: List[str],
+                       k_hop: int = 1,
+                       search: Callable[[str], List[Dict]] | None = None,
+                       subgraph: Callable[..., Dict] | None = None,
+                       rel_types: List[str] | None = None) -> tuple[List[str], Dict[str, Dict]]:
+    """
+    Run the entity search for every term concurrently and start fetching each matched
+    entity's subgraph as soon as its search returns, so search and traversal overlap.
+    `search` / `subgraph` default to the Neo4j implementations and can be swapped for
+    stand-ins. `rel_types` restricts traversal to those relation kinds.
+    Returns (matched entity names in first-seen order, {name: subgraph}).
+    """
+    search = search or search_entities_contains
+    subgraph = subgraph or get_contextual_subgraph
+    if rel_types:
+        subgraph = partial(subgraph, rel_types=rel_types)
     ents: List[str] = []
-    evidences: List[str] = []
-    log.info(f"Gathering evidence for query='{query}', k_hop={k_hop}, per_entity={per_entity}")
+    subgraphs: Dict[str, Dict] = {}
+    start = time.time()
 
-    try:
-        with _driver.session() as s:
-            res = s.run(
-                "MATCH (e:Entity) "
-                "WHERE toLower(e.name) CONTAINS toLower($q) "
-                "RETURN e.name as name "
-                "LIMIT $limit",
-                q=query,
-                limit=_cfg.retrieval_search_limit,
-            )
-            ents = [r["name"] for r in res]
-        log.info(f"Found {len(ents)} matching entities for query='{query}'.")
-    except Exception as e:
-        log.error(f"Error while searching entities for query='{query}': {e}")
-        return [], ""
-
-    for e in ents:
-        try:
-            sg = get_contextual_subgraph(e, k=k_hop)
-            rel_count = len(sg.get("rels", []))
-            if rel_count == 0:
-                log.debug(f"No relations found for entity='{e}'.")
-                continue
-            for rel in sg["rels"][:per_entity]:
-                evidence_text = (
-                    f"({rel['src']}) -[{rel['rel']}]-> ({rel['tgt']}) "
-                    f"[Conf:{rel.get('confidence', 1)}] : "
-                    f"{truncate(rel.get('evidence', ''), 300)}"
-                )
-                evidences.append(evidence_text)
-            log.info(f"Collected {min(per_entity, rel_count)} relations for entity='{e}'.")
-        except Exception as e_sub:
-            log.error(f"Error gathering subgraph for entity='{e}': {e_sub}")
-            continue
-
-    total_rels = len(evidences)
-    log.info(f"Evidence collection complete — {len(ents)} entities, {total_rels} relations total.")
-    return ents, "\n".join(evidences)
+    with ThreadPoolExecutor(max_workers=get_config().retrieval_workers) as pool:
+        pending = {pool.submit(search, t): ("search", t) for t in dedup_keep_order(t for t in terms if t)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, key = pending.pop(fut)
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    log.error(f"Retrieval {kind} failed for '{key}': {e}")
+                    continue
+                if kind == "search":
+                    for row in result:
+                        name = row["name"] if isinstance(row, dict) else row
+                        if name not in ents:
+                            ents.append(name)
+                            pending[pool.submit(subgraph, name, k=k_hop)] = ("subgraph", name)
+                elif result.get("rels"):
+                    subgraphs[key] = result
+                else:
+                    log.debug(f"No relations found for entity='{key}'.")
+
+    log.info(f"Retrieved {len(subgraphs)}/{len(ents)} subgraphs for {len(terms)} terms in {time.time() - start:.3f}s")
+    return ents, subgraphs
+
+
+def pack_evidence(ents: List[str],
+                  subgraphs: Dict[str, Dict],
+                  token_budget: int | None = None,
+                  per_entity: int | None = None) -> List[Candidate]:
+    """Rank every candidate relation in the subgraphs and return the ones that fit the budget."""
+    cfg = get_config()
+    candidates, degree, community = collect_candidates(subgraphs)
+    score_candidates(candidates, degree, community, seeds=ents)
+    return pack_context(
+        candidates,
+        token_budget=token_budget or cfg.context_token_budget,
+        evidence_max_tokens=cfg.evidence_max_tokens,
+        per_entity=per_entity,
+    )
+
+
+def pack_chunk_evidence(ents: List[str],
+                        token_budget: int | None = None,
+                        max_chunks: int | None = None,
+                        postings: Callable[[str], List[Dict]] | None = None) -> List[Dict]:
+    """
+    Source passages for the matched entities: their chunk postings (preview only)
+    are merged and ranked, and text is fetched in one bulk read for just the top
+    `max_chunks`, then cut to fit `token_budget`. Rows gain a formatted `evidence`.
+    `postings` defaults to the entity's own postings in Neo4j.
+    """
+    cfg = get_config()
+    budget = token_budget if token_budget is not None else cfg.context_chunk_budget
+    max_chunks = max_chunks or cfg.context_max_chunks
+    if not ents or budget <= 0:
+        return []
+    postings = postings or (lambda name: k_hop_chunks(name, k=0, limit=max_chunks))
+
+    merged: Dict[str, Dict] = {}
+    with ThreadPoolExecutor(max_workers=cfg.retrieval_workers) as pool:
+        for rows in pool.map(postings, ents[:max_chunks]):
+            for r in rows:
+                if r["cid"] in merged:
+                    merged[r["cid"]]["score"] += r.get("score", 0.0)
+                else:
+                    merged[r["cid"]] = dict(r)
+    top = sorted(merged.values(), key=lambda r: -r.get("score", 0.0))[:max_chunks]
+
+    selected = []
+    for r in attach_chunk_texts(top):
+        text = (r.get("text") or r.get("preview") or "").strip()
+        line = f"[Source {r['cid']}] " + truncate_tokens(text, max(1, budget - 8))
+        cost = count_tokens(line)
+        if cost > budget:
+            break
+        budget -= cost
+        r["evidence"] = line
+        selected.append(r)
+    return selected
+
+
+def gather_evidence(query: str,
+                    k_hop: int = 1,
+                    per_entity: int | None = None,
+                    token_budget: int | None = None) -> tuple[list[str], str]:
+    """
+    Find entities matching the query, rank the relations in their k-hop subgraphs
+    and pack the best ones into `token_budget` tokens (config default).
+    `per_entity` optionally caps how many relations a single matched entity contributes.
+    """
+    log.info(f"Gathering evidence for query='{query}', k_hop={k_hop}, token_budget={token_budget}")
+    ents, subgraphs = retrieve_subgraphs([query], k_hop=k_hop)
+    selected = pack_evidence(ents, subgraphs, token_budget=token_budget, per_entity=per_entity)
+    log.info(f"Evidence collection complete — {len(ents)} entities, {len(selected)} relations packed.")
+    return ents, "\n".join(c.text for c in selected)
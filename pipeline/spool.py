@@ -0,0 +1,388 @@
+"""
+Local write-ahead spool between extraction and Neo4j.
+
+Extraction results are appended to segmented, checksummed log files under
+data/cache/spool before anything touches the database. A background replayer
+drains them into Neo4j in bulk transactions and advances a checkpoint only
+after a batch commits, so a crash or an unreachable database never loses a
+generation — the replayer simply resumes from the checkpoint. Replays are
+safe because the chunk store query is idempotent.
+
+A record that keeps failing for a non-transient reason (bad data rather than an
+unreachable database) is retried on its own a few times and then moved to a
+dead-letter file, so it cannot block the records behind it.
+
+Record line format:  <crc32 as 8 hex chars> <compact JSON>\\n
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("spool")
+
+_SEG_SUFFIX = ".seg"
+_DEAD_LETTER = "dead_letter.log"
+
+
+@dataclass(frozen=True)
+class SpoolPosition:
+    segment: int
+    offset: int
+
+
+def _encode(record: Dict) -> bytes:
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"%08x " % zlib.crc32(payload) + payload + b"\n"
+
+
+def _decode(line: bytes) -> Optional[Dict]:
+    """Return the record, or None if the line is torn or fails its checksum."""
+    if len(line) < 10 or not line.endswith(b"\n") or line[8:9] != b" ":
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+class Spool:
+    """Segmented append-only record log with a durable read checkpoint."""
+
+    def __init__(self, root: Path, segment_bytes: int = 8_000_000, fsync: bool = True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._checkpoint_path = self.root / "checkpoint.json"
+        self._appended = threading.Event()
+
+        segs = self.segments()
+        self._active = segs[-1] if segs else 1
+        self._repair_tail(self._seg_path(self._active))
+        self._fh = open(self._seg_path(self._active), "ab")
+
+    # ---------------------------------------------------------------
+    # Segments
+    # ---------------------------------------------------------------
+    def _seg_path(self, n: int) -> Path:
+        return self.root / f"{n:08d}{_SEG_SUFFIX}"
+
+    def segments(self) -> List[int]:
+        return sorted(int(p.stem) for p in self.root.glob(f"*{_SEG_SUFFIX}") if p.stem.isdigit())
+
+    @staticmethod
+    def _repair_tail(path: Path) -> None:
+        """Cut a torn final line left by a crash mid-append, so new records start clean."""
+        if not path.exists() or path.stat().st_size == 0:
+            return
+        with open(path, "rb+") as fh:
+            data = fh.read()
+            if data.endswith(b"\n"):
+                return
+            keep = data.rfind(b"\n") + 1
+            fh.truncate(keep)
+            log.warning(f"Truncated torn tail of spool segment {path.name} ({len(data) - keep} bytes)")
+
+    # ---------------------------------------------------------------
+    # Writing
+    # ---------------------------------------------------------------
+    def append(self, record: Dict) -> None:
+        """Durably append one record (flushed and fsynced before returning)."""
+        line = _encode(record)
+        with self._lock:
+            if self._fh.tell() and self._fh.tell() + len(line) > self.segment_bytes:
+                self._fh.close()
+                self._active += 1
+                self._fh = open(self._seg_path(self._active), "ab")
+            self._fh.write(line)
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+        self._appended.set()
+
+    def wait_for_append(self, timeout: float) -> bool:
+        fired = self._appended.wait(timeout)
+        self._appended.clear()
+        return fired
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+    # ---------------------------------------------------------------
+    # Reading / checkpoint
+    # ---------------------------------------------------------------
+    def load_checkpoint(self) -> SpoolPosition:
+        try:
+            data = json.loads(self._checkpoint_path.read_text(encoding="utf-8"))
+            return SpoolPosition(int(data["segment"]), int(data["offset"]))
+        except FileNotFoundError:
+            segs = self.segments()
+            return SpoolPosition(segs[0] if segs else 1, 0)
+        except Exception as e:
+            log.error(f"Unreadable spool checkpoint, restarting from oldest segment: {e}")
+            segs = self.segments()
+            return SpoolPosition(segs[0] if segs else 1, 0)
+
+    def commit(self, pos: SpoolPosition) -> None:
+        """Persist the checkpoint atomically and delete fully consumed segments."""
+        self.save_checkpoint(pos)
+        self.drop_consumed(pos)
+
+    def save_checkpoint(self, pos: SpoolPosition) -> None:
+        tmp = self._checkpoint_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"segment": pos.segment, "offset": pos.offset}), encoding="utf-8")
+        os.replace(tmp, self._checkpoint_path)
+
+    def drop_consumed(self, pos: SpoolPosition) -> None:
+        for n in self.segments():
+            if n < pos.segment:
+                self._seg_path(n).unlink(missing_ok=True)
+
+    def read(self, pos: SpoolPosition, max_records: int) -> Tuple[List[Dict], SpoolPosition]:
+        """Read up to `max_records` valid records from `pos`; corrupt lines are skipped."""
+        entries, next_pos = self.read_entries(pos, max_records)
+        return [rec for rec, _ in entries], next_pos
+
+    def read_entries(self, pos: SpoolPosition,
+                     max_records: int) -> Tuple[List[Tuple[Dict, SpoolPosition]], SpoolPosition]:
+        """Like read(), but pairs each record with the position just past it."""
+        entries: List[Tuple[Dict, SpoolPosition]] = []
+        seg, offset = pos.segment, pos.offset
+        while len(entries) < max_records:
+            path = self._seg_path(seg)
+            with self._lock:
+                active = self._active
+            partial = False
+            if path.exists():
+                with open(path, "rb") as fh:
+                    fh.seek(offset)
+                    while len(entries) < max_records:
+                        line = fh.readline()
+                        if not line:
+                            break
+                        if not line.endswith(b"\n"):
+                            partial = True  # record still being written; retry next poll
+                            break
+                        offset += len(line)
+                        rec = _decode(line)
+                        if rec is None:
+                            log.error(f"Skipping corrupt spool record in {path.name} at offset {offset - len(line)}")
+                            continue
+                        entries.append((rec, SpoolPosition(seg, offset)))
+            if partial or len(entries) >= max_records or seg >= active:
+                break
+            seg, offset = seg + 1, 0
+        return entries, SpoolPosition(seg, offset)
+
+    # ---------------------------------------------------------------
+    # Dead letters
+    # ---------------------------------------------------------------
+    def quarantine(self, record: Dict, error: str, attempts: int) -> None:
+        """Durably set a record aside in the dead-letter file (same line format)."""
+        line = _encode({"ts": time.time(), "error": error, "attempts": attempts, "record": record})
+        with self._lock, open(self.root / _DEAD_LETTER, "ab") as fh:
+            fh.write(line)
+            fh.flush()
+            if self.fsync:
+                os.fsync(fh.fileno())
+
+    def dead_letters(self) -> int:
+        path = self.root / _DEAD_LETTER
+        if not path.exists():
+            return 0
+        with open(path, "rb") as fh:
+            return sum(1 for _ in fh)
+
+    def backlog(self, pos: SpoolPosition) -> Dict:
+        """How far the reader at `pos` is behind the writer."""
+        pending_bytes, pending_records, oldest_ts = 0, 0, None
+        for n in self.segments():
+            if n < pos.segment:
+                continue
+            path = self._seg_path(n)
+            try:
+                with open(path, "rb") as fh:
+                    if n == pos.segment:
+                        fh.seek(pos.offset)
+                    data = fh.read()
+            except FileNotFoundError:
+                continue  # consumed and deleted by the replayer since we listed it
+            pending_bytes += len(data)
+            pending_records += data.count(b"\n")
+            if oldest_ts is None and data:
+                first = _decode(data[: data.find(b"\n") + 1])
+                oldest_ts = first.get("ts") if first else None
+        return {
+            "pending_records": pending_records,
+            "pending_bytes": pending_bytes,
+            "oldest_pending_age_s": round(time.time() - oldest_ts, 1) if oldest_ts else 0.0,
+            "segments": len(self.segments()),
+        }
+
+
+class SpoolReplayer(threading.Thread):
+    """Daemon thread that drains the spool into the graph store in batches."""
+
+    def __init__(self,
+                 spool: Spool,
+                 store_batch: Callable[[List[Dict]], None],
+                 batch_size: int = 50,
+                 poll_interval: float = 1.0,
+                 max_backoff: float = 60.0,
+                 max_attempts: int = 5,
+                 is_transient: Callable[[Exception], bool] | None = None):
+        super().__init__(name="spool-replayer", daemon=True)
+        self.spool = spool
+        self.store_batch = store_batch
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.is_transient = is_transient or (lambda e: isinstance(e, OSError))
+        self.position = spool.load_checkpoint()
+        self.last_error: Optional[str] = None
+        self.replayed = 0
+        self.quarantined = spool.dead_letters()
+        self._failures: Dict[SpoolPosition, int] = {}
+        self._stop_evt = threading.Event()
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop_evt.set()
+        self.spool._appended.set()
+        self.join(timeout)
+
+    def _advance(self, pos: SpoolPosition) -> None:
+        if pos != self.position:
+            # publish the new position before deleting segments, so lag() readers
+            # on other threads never start from a segment that is about to vanish
+            self.spool.save_checkpoint(pos)
+            self.position = pos
+            self.spool.drop_consumed(pos)
+
+    def drain_once(self) -> int:
+        """Replay one batch. Returns how many records were committed."""
+        entries, next_pos = self.spool.read_entries(self.position, self.batch_size)
+        if entries:
+            try:
+                self.store_batch([rec for rec, _ in entries])
+            except Exception as e:
+                if self.is_transient(e):
+                    raise
+                log.warning(f"Spool batch of {len(entries)} failed, replaying records one by one: {e}")
+                return self._drain_singly(entries, next_pos)
+        self._advance(next_pos)
+        self.replayed += len(entries)
+        return len(entries)
+
+    def _drain_singly(self, entries: List[Tuple[Dict, SpoolPosition]], next_pos: SpoolPosition) -> int:
+        """
+        Store records one at a time, checkpointing after each. A record that fails
+        for a non-transient reason is retried on later passes (the caller backs off)
+        and quarantined after `max_attempts`, so it stops blocking the spool.
+        """
+        stored = 0
+        for rec, end in entries:
+            try:
+                self.store_batch([rec])
+                stored += 1
+                self.replayed += 1
+            except Exception as e:
+                if self.is_transient(e):
+                    raise
+                attempts = self._failures.get(end, 0) + 1
+                if attempts < self.max_attempts:
+                    self._failures[end] = attempts
+                    raise
+                self.spool.quarantine(rec, str(e), attempts)
+                self._failures.pop(end, None)
+                self.quarantined += 1
+                chunk_id = (rec.get("chunk") or {}).get("id")
+                log.error(f"Quarantined spool record for chunk {chunk_id} after {attempts} attempts: {e}")
+            self._advance(end)
+        self._advance(next_pos)
+        return stored
+
+    def run(self) -> None:
+        backoff = self.poll_interval
+        log.info(f"Spool replayer started at segment {self.position.segment}, offset {self.position.offset}")
+        while not self._stop_evt.is_set():
+            try:
+                n = self.drain_once()
+                self.last_error = None
+                backoff = self.poll_interval
+                if n < self.batch_size:
+                    self.spool.wait_for_append(self.poll_interval)
+            except Exception as e:
+                self.last_error = str(e)
+                log.warning(f"Spool replay failed, retrying in {backoff:.1f}s: {e}")
+                self._stop_evt.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+        log.info("Spool replayer stopped.")
+
+    def lag(self) -> Dict:
+        stats = self.spool.backlog(self.position)
+        stats.update(
+            replayed=self.replayed,
+            last_error=self.last_error,
+            quarantined=self.quarantined,
+            dead_letter_path=str(self.spool.root / _DEAD_LETTER),
+        )
+        return stats
+
+
+# -------------------------------------------------------------------
+# Process-wide spool + replayer
+# -------------------------------------------------------------------
+def _neo4j_transient(e: Exception) -> bool:
+    """Errors worth retrying forever: the database (or disk) is unavailable, not the record bad."""
+    try:
+        from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
+    except ImportError:
+        return isinstance(e, OSError)
+    return isinstance(e, (ServiceUnavailable, SessionExpired, TransientError, OSError))
+
+
+def _build_replayer() -> SpoolReplayer:
+    from pipeline.neo4j_client import store_chunks_bulk
+    from pipeline.resources import get_config
+
+    cfg = get_config()
+    spool = Spool(cfg.cache_dir / "spool", segment_bytes=cfg.spool_segment_bytes)
+    replayer = SpoolReplayer(
+        spool, store_chunks_bulk, batch_size=cfg.spool_batch_size,
+        max_attempts=cfg.spool_max_attempts, is_transient=_neo4j_transient,
+    )
+    replayer.start()
+    return replayer
+
+
+def get_replayer() -> SpoolReplayer:
+    """The shared replayer; starting it also resumes any backlog left by a previous run."""
+    from pipeline.resources import shared
+    return shared("spool_replayer", _build_replayer)
+
+
+def spool_chunk(chunk: Dict, entities: List[Dict], relations: List[Dict]) -> None:
+    """Append one extraction result to the spool; the replayer stores it in Neo4j."""
+    get_replayer().spool.append({
+        "ts": time.time(),
+        "chunk": chunk,
+        "entities": entities,
+        "relations": relations,
+    })
+
+
+def spool_lag() -> Dict:
+    return get_replayer().lag()
@@ -0,0 +1,71 @@
+"""
+End-to-end check of the streaming answer path without Neo4j or Google:
+a local SSE server stands in for Gemini (via GEMINI_ENDPOINT) and the graph
+lookups are injected into answer_stream.
+
+    python rendom/testing_answer_stream.py
+"""
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+DELTAS = ["Delhi is ", "the capital ", "of India – not São Paulo."]  # non-ASCII checks UTF-8 decoding
+
+
+class GeminiStub(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        assert "Delhi" in body["contents"][0]["parts"][0]["text"], "evidence missing from prompt"
+        assert ":streamGenerateContent" in self.path and "alt=sse" in self.path
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for d in DELTAS:
+            event = {"candidates": [{"content": {"parts": [{"text": d}]}}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GeminiStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["GEMINI_ENDPOINT"] = f"http://127.0.0.1:{server.server_port}/v1beta/models"
+    os.environ["GEMINI_API_KEY"] = ""  # a stub endpoint needs no key
+    for var in ("NEO4J_URI", "NEO4J_USER", "NEO4J_PASSWORD"):
+        os.environ.setdefault(var, "unused")  # the graph is injected below
+
+    from pipeline.answer import AnswerTrace, answer_stream
+
+    def search(term):
+        return [{"name": "Delhi"}]
+
+    def subgraph(name, k=1):
+        return {
+            "entities": [{"name": "Delhi"}, {"name": "India"}],
+            "rels": [{"src": "Delhi", "rel": "CAPITAL_OF", "tgt": "India",
+                      "evidence": "Delhi is the capital of India.", "confidence": 1.0}],
+        }
+
+    def postings(name):
+        return [{"cid": "c1", "text": "Delhi is the capital of India.", "score": 1.0}]
+
+    trace = AnswerTrace(question="What is Delhi the capital of?")
+    deltas = list(answer_stream(trace.question, trace=trace, search=search, subgraph=subgraph, postings=postings))
+    server.shutdown()
+
+    assert deltas == DELTAS, deltas
+    assert trace.relations_used == 1 and trace.chunks_used == 1, trace
+    assert trace.ttft_s is not None and 0 <= trace.ttft_s <= trace.total_s, trace
+    print(f"OK: {''.join(deltas)!r} ttft={trace.ttft_s:.3f}s total={trace.total_s:.3f}s")
+
+
+if __name__ == "__main__":
+    main()